@@ -0,0 +1,207 @@
+# bench_energenie.py  18/10/2026 - benchmarks for the codec and radio hot paths
+#
+# Runs unchanged on CPython and MicroPython, one JSON line per benchmark:
+#   python3 bench_energenie.py [results.jsonl [baseline.jsonl]]
+#   >>> import bench_energenie; bench_energenie.main("results.jsonl", "baseline.jsonl")
+# With a baseline (an earlier results file) each result is compared to it.
+
+import gc
+import sys
+import json
+import plat
+import energenie
+from energenie import RFM69, CRC, Crypt, OpenThingsLite, OpenThingsView, Value, Parameter
+
+try:
+    import tracemalloc  # CPython
+except ImportError:
+    tracemalloc = None
+
+MSG3 = b"\x16\x04\x05\xC9\x8C\xFB\xD7\x5A\x44\x8E\xEE\x83\x21\xCC\xCB\xCF\x4A\xB8\x64\x66\x2C\x64\xAF"
+ADDR = 0x02000373
+SCALE = 1 if plat.MOCKING else 20  # the Pico does fewer iterations
+REGRESSION_PCT = 10  # slower than the baseline by more than this is reported
+
+class BenchLink:
+    """A quiet SPI link that answers just enough for send and receive, and counts transactions"""
+    # It reports every mode as ready, so RFM69 runs all its waits on it.
+    ACCURATE = True
+
+    def __init__(self, frame=None):
+        self.frame = frame  # always ready to be received, if not None
+        self.transactions = 0
+        self._fifo = 0
+
+    def transfer(self, tx=None, rx=None, select:bool=True) -> None:
+        if select: self.transactions += 1
+        if isinstance(tx, int):  # burst read of the FIFO, after the length byte
+            for i in range(len(rx)):
+                rx[i] = self.frame[self._fifo]
+                self._fifo += 1
+        elif rx is not None and tx is not None:
+            addr = tx[0]
+            if addr == RFM69.R_IRQFLAGS1:
+                rx[1] = RFM69.M_MODEREADY | RFM69.M_RXREADY | RFM69.M_TXREADY
+            elif addr == RFM69.R_IRQFLAGS2:
+                rx[1] = 0 if self.frame is None else RFM69.M_PAYLOADREADY
+            elif addr == RFM69.R_VERSION:
+                rx[1] = RFM69.V_VERSION
+            else:
+                rx[1] = 0
+
+    def select(self) -> None:
+        self.transactions += 1
+        self._fifo = -1  # the address byte comes first
+
+    def byte(self, tx_byte:int) -> int:
+        if tx_byte & 0x80 or self._fifo < 0:
+            self._fifo += 1
+            return 0
+        b = self.frame[self._fifo]
+        self._fifo += 1
+        return b
+
+    def deselect(self): pass
+    def reset(self): pass
+    def power(self, flag=True): pass
+    def is_int(self): return self.frame is not None
+    def irq(self, handler): pass
+    def has_fifo_irq(self): return False
+    def txing(self, flag): pass
+    def rxing(self, flag): pass
+
+def alloc_bytes(op) -> int:
+    """Bytes allocated by one call of op, -1 if it can't be measured here"""
+    if hasattr(gc, "mem_alloc"):
+        # MicroPython: with the gc off nothing is freed, so this is gross heap use
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        op()
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used
+    if tracemalloc is not None:
+        # CPython: refcounting frees as it goes, so use the peak over the call
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        used = tracemalloc.get_traced_memory()[1] - start
+        tracemalloc.stop()
+        return used
+    return -1
+
+def bench(name:str, op, n:int, link:BenchLink or None=None) -> dict:
+    """Time n calls of op, and measure SPI transactions and allocation per call"""
+    op()  # warm up, e.g. fill caches
+    alloc = alloc_bytes(op)
+    n = max(1, n // SCALE)
+    spi = 0 if link is None else link.transactions
+    gc.collect()
+    start = plat.ticks_us()
+    for i in range(n):
+        op()
+    us = max(1, plat.ticks_diff(plat.ticks_us(), start))
+    return {
+        "name":       name,
+        "impl":       sys.implementation.name,
+        "n":          n,
+        "us_per_op":  round(us / n, 2),
+        "ops_per_s":  round(n * 1000000 / us, 1),
+        "spi_per_op": 0 if link is None else round((link.transactions - spi) / n, 2),
+        "alloc_b":    alloc,
+    }
+
+def benches() -> list:
+    """All the benchmarks, as (name, op, n, link)"""
+    result = []
+    data = bytes(range(energenie.EnergenieRadio.MTU))
+    result.append(("crc_calc", lambda: CRC.calc(data), 2000, None))
+
+    cbuf = bytearray(MSG3)
+    result.append(("crypt_block", lambda: Crypt(242, 0xC98C).block(cbuf), 2000, None))
+
+    result.append(("make_switch_message",
+                   lambda: OpenThingsLite.make_switch_message(ADDR, True), 1000, None))
+
+    dbuf = bytearray(len(MSG3))
+    def decode():
+        dbuf[:] = MSG3
+        OpenThingsLite.decode(dbuf)
+    result.append(("decode", decode, 1000, None))
+
+    view = OpenThingsView(None)
+    def view_decode():
+        dbuf[:] = MSG3
+        if OpenThingsLite.decrypt(dbuf):
+            view.bind(dbuf)
+            view.find(Parameter.P_REAL_POWER)
+    result.append(("view_decode", view_decode, 1000, None))
+
+    result.append(("value_encode", lambda: Value.encode(1234, Parameter.T_UINT, 2), 5000, None))
+    vbuf = b"\x04\xD2"
+    result.append(("value_decode", lambda: Value.decode(vbuf, Parameter.T_UINT, 2), 5000, None))
+
+    result.append(("legacy_encode_msg",
+                   lambda: energenie.LegacySocket.encode_msg(0x6C6C6, 0x0F), 2000, None))
+
+    link = BenchLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.duty = energenie.DutyCycle(limit_pct=100)  # measuring, not regulating
+    radio.on()
+    radio.want_cfg(radio.FSK)
+    payload = OpenThingsLite.make_switch_message(ADDR, True)
+    result.append(("send_x4", lambda: radio.send(payload, 4), 500, link))
+
+    rlink = BenchLink(MSG3)
+    rradio = energenie.EnergenieRadio(rlink)
+    rradio.always_receive()
+    rbuf = bytearray(rradio.MTU)
+    result.append(("recvinto", lambda: rradio.recvinto(rbuf), 1000, rlink))
+    return result
+
+def load(filename:str) -> dict:
+    """Read a results file, as name -> result"""
+    results = {}
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                results[r["name"]] = r
+    return results
+
+def compare(results:list, baseline:dict) -> int:
+    """Print each result against the baseline, returns the number of regressions"""
+    regressions = 0
+    for r in results:
+        base = baseline.get(r["name"])
+        if base is None: continue
+        pct = (r["us_per_op"] - base["us_per_op"]) * 100 / base["us_per_op"]
+        slow = pct > REGRESSION_PCT
+        if slow: regressions += 1
+        print("%-20s %10.2fus -> %10.2fus %+6.1f%% spi:%s->%s alloc:%d->%d%s"
+              % (r["name"], base["us_per_op"], r["us_per_op"], pct, base["spi_per_op"],
+                 r["spi_per_op"], base["alloc_b"], r["alloc_b"], " REGRESSION" if slow else ""))
+    return regressions
+
+def main(out:str or None=None, baseline:str or None=None) -> int:
+    results = []
+    for name, op, n, link in benches():
+        r = bench(name, op, n, link)
+        print(json.dumps(r))
+        results.append(r)
+
+    if out is not None:
+        with open(out, "w") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    if baseline is not None:
+        return compare(results, load(baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:3]))
+
+#END: bench_energenie.py
@@ -0,0 +1,151 @@
+# decode_capture.py  18/10/2026 - parallel offline decoder for capture files (host only)
+#
+#   python3 decode_capture.py capture.bin [-j JOBS] [--format jsonl|csv] [--unordered] [-o OUT]
+#
+# The capture file (see energenie.Capture) is memory mapped and split into
+# record aligned chunks, which are decrypted, CRC checked and decoded across
+# a process pool. Output streams out as each chunk is done, in file order
+# unless --unordered. Frames/sec and CRC failures are reported on stderr.
+# Each record has its raw valuebytes, and a null value if it can't be decoded.
+
+import sys
+import os
+import io
+import csv
+import json
+import mmap
+import time
+import argparse
+import multiprocessing
+from energenie import Capture, OpenThingsLite, OpenThingsView, hexstr
+
+CHUNK_BYTES = 4 * 1024 * 1024
+CSV_HEADER  = ("t_us", "rssi", "cfg", "mfrid", "productid", "sensorid", "paramname", "value", "valuebytes")
+
+def index(data, chunk_bytes:int=CHUNK_BYTES) -> list:
+    """Split a capture into (start, end) byte ranges that hold whole records"""
+    if bytes(data[0:len(Capture.MAGIC)]) != Capture.MAGIC:
+        raise ValueError("Not a capture file")
+    chunks = []
+    start = i = len(Capture.MAGIC)
+    size = len(data)
+    while i + Capture.HEAD <= size:
+        end = i + Capture.HEAD + data[i]
+        if end > size: break  # cut short, e.g. still being written
+        i = end
+        if i - start >= chunk_bytes:
+            chunks.append((start, i))
+            start = i
+    if i > start: chunks.append((start, i))
+    return chunks
+
+def value(rec):
+    """A record's value, or None if it can't be decoded (e.g. an unknown typeid)"""
+    try:
+        return rec.value()
+    except Exception:
+        return None  # soft fail, the valuebytes still go out
+
+def decode_chunk(data, start:int, end:int, fmt:str="jsonl") -> tuple:
+    """Decode the records in data[start:end], returns (text, frames, crc_failures)"""
+    text = io.StringIO()
+    rows = csv.writer(text, lineterminator="\n") if fmt == "csv" else None
+    frames = bad = 0
+    view = OpenThingsView(None)
+    i = start
+    while i < end:
+        n = data[i]
+        t = int.from_bytes(data[i+1:i+7], "little")
+        rssi, cfg = data[i+7], data[i+8]
+        buf = bytearray(data[i+Capture.HEAD:i+Capture.HEAD+n])
+        i += Capture.HEAD + n
+        frames += 1
+        if not OpenThingsLite.decrypt(buf, warn=False):
+            bad += 1
+            continue
+        view.bind(buf)
+        if rows is not None:
+            # a missing sensorid (None) is written as an empty field
+            head = (t, rssi, cfg, view.mfrid(), view.productid(), view.sensorid())
+            for rec in view.records():
+                rows.writerow(head + (rec.paramname(), value(rec), hexstr(rec.valuebytes())))
+        else:
+            text.write(json.dumps({
+                "t_us": t, "rssi": rssi, "cfg": cfg, "mfrid": view.mfrid(),
+                "productid": view.productid(), "sensorid": view.sensorid(),
+                "recs": [[rec.paramname(), value(rec), hexstr(rec.valuebytes())] for rec in view.records()]
+            }) + "\n")
+    return text.getvalue(), frames, bad
+
+#----- WORKER PROCESSES --------------------------------------------------------
+_data = None  # each worker maps the file once
+
+def _init(filename:str) -> None:
+    global _data
+    f = open(filename, "rb")
+    _data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _work(job:tuple) -> tuple:
+    start, end, fmt = job
+    return decode_chunk(_data, start, end, fmt)
+
+def decode_file(filename:str, out, jobs:int=0, chunk_bytes:int=CHUNK_BYTES,
+                fmt:str="jsonl", ordered:bool=True) -> dict:
+    """Decode a whole capture file to out, returns stats"""
+    jobs = jobs or os.cpu_count() or 1
+    started = time.time()
+    stats = {"frames": 0, "crc_failures": 0, "chunks": 0}
+    if fmt == "csv": csv.writer(out, lineterminator="\n").writerow(CSV_HEADER)
+    if os.path.getsize(filename) == 0:
+        return stats
+    with open(filename, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        chunks = index(data, chunk_bytes)
+        work = [(start, end, fmt) for start, end in chunks]
+        stats["chunks"] = len(work)
+        if jobs == 1 or len(work) <= 1:
+            results = (decode_chunk(data, start, end, fmt) for start, end, fmt in work)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(jobs, _init, (filename,))
+            results = (pool.imap if ordered else pool.imap_unordered)(_work, work)
+        try:
+            for text, frames, bad in results:
+                out.write(text)
+                stats["frames"] += frames
+                stats["crc_failures"] += bad
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        data.close()
+    elapsed = time.time() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["frames_per_s"] = round(stats["frames"] / elapsed, 1) if elapsed > 0 else 0
+    return stats
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Decode an energenie capture file")
+    parser.add_argument("filename")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--unordered", action="store_true", help="output chunks as they finish")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1024*1024))
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        stats = decode_file(args.filename, out, args.jobs, int(args.chunk_mb * 1024 * 1024),
+                            args.format, not args.unordered)
+    finally:
+        if out is not sys.stdout: out.close()
+    sys.stderr.write("frames:%d crc_failures:%d chunks:%d %.1f frames/s\n"
+                     % (stats["frames"], stats["crc_failures"], stats["chunks"],
+                        stats.get("frames_per_s", 0)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#END: decode_capture.py
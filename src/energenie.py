@@ -11,21 +11,24 @@ def hexstr(data) -> str:
     return " ".join(res)
 
 #----- SPI LINK TO RADIO -------------------------------------------------------
-def get_radio_link():
-    """Get a mock or a real SPI connnection to the RFM69 radio"""
+def get_radio_link(simulate:bool=False):
+    """Get a mock, simulated (host only) or real SPI connnection to the RFM69 radio"""
+    if plat.MOCKING and simulate:
+        from sim_rfm69 import SimulatedRFM69
+        return SimulatedRFM69()
+
     if plat.MOCKING:
         class MockSPIRadio:
             def __init__(self):
-                pass
+                self.intpin = plat.Pin(0, plat.Pin.IN)  # emulated DIO0
 
             @staticmethod
             def cmd(data) -> str:
                 rdwr = "WR" if (data & 0x80) != 0 else "RD"
-                data &= 0x7F
-                for k,v in RFM69.__dict__.items():
-                    if type(v) == int and k.startswith("R_") and v==data:
-                        return "%s %s" % (rdwr, k)
-                return "??? %s %02X" % (rdwr, data)
+                name = RFM69.regname(data & 0x7F)
+                if name is not None:
+                    return "%s %s" % (rdwr, name)
+                return "??? %s %02X" % (rdwr, data & 0x7F)
 
             @staticmethod
             def transfer(tx=None, rx=None, select:bool=True) -> int:
@@ -48,8 +51,10 @@ def get_radio_link():
             def reset(): pass
             @staticmethod
             def power(flag=True) -> None: pass
+            def is_int(self) -> bool: return self.intpin() == 1
+            def irq(self, handler) -> None: self.intpin.irq(handler, plat.Pin.IRQ_RISING)
             @staticmethod
-            def is_int() -> bool: return False
+            def has_fifo_irq() -> bool: return False
             @staticmethod
             def txing(flag): pass
             @staticmethod
@@ -61,7 +66,7 @@ def get_radio_link():
         from machine import Pin, SPI
         class PicoSPIRadio:
             def __init__(self, cspin, link, txledpin=None, rxledpin=None, resetpin=None,
-                         enpin=None, intpin=None, cspol=0):
+                         enpin=None, intpin=None, cspol=0, fifopin=None):
                 self._link = link
                 self._resetpin = resetpin
                 self._txledpin = txledpin
@@ -69,6 +74,7 @@ def get_radio_link():
                 self._cspin    = cspin
                 self._enpin    = enpin
                 self._intpin   = intpin
+                self._fifopin  = fifopin
                 if enpin is not None: enpin(1)  # prevent it floating around
 
                 if cspol:  # active high
@@ -93,6 +99,19 @@ def get_radio_link():
                 if self._intpin is not None:
                     return self._intpin()
 
+            def irq(self, handler) -> None:
+                """Call handler(pin) on a rising edge of the interrupt pin, None to stop"""
+                if self._intpin is not None:
+                    self._intpin.irq(handler=handler, trigger=Pin.IRQ_RISING)
+
+            def has_fifo_irq(self) -> bool:
+                return self._fifopin is not None
+
+            def fifo_irq(self, handler) -> None:
+                """Call handler(pin) when DIO1 (FifoLevel) falls, or None to stop"""
+                if self._fifopin is not None:
+                    self._fifopin.irq(handler=handler, trigger=Pin.IRQ_FALLING)
+
             def reset(self) -> None:
                 """Hard reset the radio"""
                 if self._resetpin is not None:
@@ -146,6 +165,7 @@ def get_radio_link():
         SPEED_HZ  = 1000000
         SPI_N     = 0
         GP_G0     = 0   # DIO0 INT pin
+        GP_G1     = None  # DIO1 FIFOLEVEL pin, if wired
         GP_CS     = 1
         GP_SCK    = 2
         GP_MOSI   = 3
@@ -167,7 +187,8 @@ def get_radio_link():
                         enpin    = Pin(GP_EN, Pin.OUT),
                         txledpin = Pin(GP_TX_LED, Pin.OUT),
                         rxledpin = Pin(GP_RX_LED, Pin.OUT),
-                        intpin   = Pin(GP_G0, Pin.IN))
+                        intpin   = Pin(GP_G0, Pin.IN),
+                        fifopin  = None if GP_G1 is None else Pin(GP_G1, Pin.IN))
 
 
 #----- RFM69 -------------------------------------------------------------------
@@ -278,6 +299,8 @@ class RFM69:
     R_NODEADRS      = 0x39
     R_BROADCASTADRS = 0x3A
     R_AUTOMODES     = 0x3B
+    V_AUTOMODES_OFF   = 0x00
+    V_AUTOMODES_TX    = 0x5B  # enter TX on FifoLevel rising, leave on PacketSent
     R_FIFOTHRESH    = 0x3C
     V_FIFOTHRESH1     = 0x81  # Condition to start packet transmission: at least one byte in FIFO
     V_FIFOTHRESH30    = 0x1E  # Condition to start packet transmission: wait for 30 bytes in FIFO
@@ -298,14 +321,52 @@ class RFM69:
     R_TESTAFC      = 0x71
     # RESERVED 72..7F
 
+    FIFO_SIZE = 66
+    FIFO_HALF = 32  # largest payload that transmit_burst can repeat
+
     RX_POLL = 0
     RX_INT  = 1
 
+    class WaitTimeout(Exception): pass
+
+    WAIT_TIMEOUT_US  = 1000000  # default deadline for waitreg
+    WAIT_POLL_US     = 20       # first sleep between polls, 0 to spin
+    WAIT_POLL_MAX_US = 1000     # sleep between polls backs off up to this
+
+    # registers that the chip changes itself, or where a write triggers an
+    # action, so writes to these are never skipped by the shadow cache
+    VOLATILE = (R_FIFO, R_OPMODE, R_OSC1, R_AFCFEI, R_RSSICONFIG, R_IRQFLAGS1, R_IRQFLAGS2)
+
+    _NAMES = None  # register address -> "R_..." name, built by regname()
+
+    @staticmethod
+    def regname(addr:int) -> str or None:
+        """Name of a register, from a reverse index built on first use"""
+        if RFM69._NAMES is None:
+            names = {}
+            for k, v in RFM69.__dict__.items():
+                if type(v) == int and k.startswith("R_") and v not in names:
+                    names[v] = k
+            RFM69._NAMES = names
+        return RFM69._NAMES.get(addr)
+
     def __init__(self, link=None):
         self._spi = link
+        # links that only trace SPI traffic have no registers to wait on
+        self.mocking = plat.MOCKING and not getattr(link, "ACCURATE", False)
+        self.autotx = False  # sends from RX go into TX by AutoModes, by themselves
         self._mode = self.V_OPMODE_STBY
         self._rxmode = self.RX_POLL
-        self._regbuf = bytearray(2)  # reusable buffer for reg reads and writes
+        self.dio_edges = 0  # DIO0 rising edges seen, while in RX_INT
+        self._handler = None  # irq() handler, called on each DIO0 edge
+        self._on_dio0_ref = self._on_dio0  # bound up front, the IRQ must not allocate
+        self._regbuf = bytearray(2)  # reusable buffer for reg reads
+        self._wrbuf  = bytearray(2)  # reusable buffer for reg writes
+        self._shadow = bytearray(0x80)  # last value written to each register
+        self._known  = bytearray(0x80)  # 1 if the shadow value is valid
+        self.skipped = 0  # number of redundant register writes skipped
+        # site -> [calls, iterations, total_us, max_us, timeouts]
+        self.waitstats = {}
 
     def readreg(self, addr: int) -> int:
         self._regbuf[0] = addr
@@ -314,25 +375,120 @@ class RFM69:
         return self._regbuf[1]
 
     def writereg(self, addr: int, value: int) -> None:
+        """Write a register, unless it is already known to hold this value"""
         ##print("writereg:%02X=%02X" % (addr, value))
-        self._spi.transfer(bytearray((addr | self._WRITE, value)))
+        if self._known[addr] and self._shadow[addr] == value:
+            self.skipped += 1
+            return
+        self._wrbuf[0] = addr | self._WRITE
+        self._wrbuf[1] = value
+        self._spi.transfer(self._wrbuf)
+        if addr not in self.VOLATILE:
+            self._shadow[addr] = value
+            self._known[addr]  = 1
+
+    @staticmethod
+    def compile(table) -> tuple:
+        """Compile a (reg,value) table into burst writes of consecutive registers"""
+        # Each burst is [addr|WRITE, value, value...], the RFM69 auto-increments
+        # the address on each byte after the first.
+        values = {}
+        for reg, value in table:
+            values[reg] = value  # last one wins
+        bursts = []
+        burst = None
+        for reg in sorted(values):
+            if burst is None or reg != (burst[0] & 0x7F) + len(burst) - 1:
+                burst = bytearray((reg | RFM69._WRITE,))
+                bursts.append(burst)
+            burst.append(values[reg])
+        return tuple(bursts)
+
+    def writeprog(self, prog:tuple) -> None:
+        """Write a compiled table, only the span of each burst that has changed"""
+        known, shadow = self._known, self._shadow  # perf
+        for burst in prog:
+            base = burst[0] & 0x7F
+            first = last = None
+            for i in range(1, len(burst)):
+                addr = base + i - 1
+                if not known[addr] or shadow[addr] != burst[i] or addr in self.VOLATILE:
+                    if first is None: first = i
+                    last = i
+            if first is None:
+                self.skipped += len(burst) - 1
+                continue
+            self.skipped += (len(burst) - 1) - (last - first + 1)
+
+            if first == 1 and last == len(burst) - 1:
+                self._spi.transfer(burst)  # whole burst
+            else:
+                self._spi.select()
+                self._spi.byte((base + first - 1) | self._WRITE)
+                self._spi.transfer(memoryview(burst)[first:last+1], select=False)
+                self._spi.deselect()
+
+            for i in range(first, last+1):
+                addr = base + i - 1
+                if addr not in self.VOLATILE:
+                    shadow[addr] = burst[i]
+                    known[addr]  = 1
+
+    def shadow(self, addr: int) -> int or None:
+        """Last value written to a register, or None if not known"""
+        if self._known[addr]: return self._shadow[addr]
+        return None
+
+    def invalidate(self) -> None:
+        """Forget all shadowed register values, e.g. after a reset"""
+        for i in range(len(self._known)):
+            self._known[i] = 0
 
     ##def checkreg(self, addr: int, mask: int, value: int) -> bool:
     ##    v = self.readreg(addr)
     ##    return (v & mask) == value
 
-    def waitreg(self, addr: int, mask: int, value: int):
+    def waitreg(self, addr: int, mask: int, value: int, site:str="waitreg",
+                timeout_us:int or None=None, dio:int or None=None) -> None:
+        """Wait for (reg & mask) == value, raises WaitTimeout if it takes too long"""
+        # Polls back off from WAIT_POLL_US doubling up to WAIT_POLL_MAX_US.
+        # With dio (dio_edges from before the thing being waited for, in
+        # RX_INT) the register is only read once DIO0 has risen since then or
+        # is high, and until it has the wait idles for an interrupt instead.
+        # DIO0 must be mapped to the flag, mapping 00 is PacketSent in TX and
+        # PayloadReady in RX. The edge is latched, so a short pulse isn't lost.
         ##print("waitreg: %02X & %02X == %02X?" % (addr, mask, value))
+        if timeout_us is None: timeout_us = self.WAIT_TIMEOUT_US
+        start = plat.ticks_us()
+        poll_us = self.WAIT_POLL_US
+        iterations = 0
         while True:
-            v = self.readreg(addr)
-            ##print("  got:%02X" % v, end=" ")
-            if (v & mask) == value:
-                ##print("YES")
-                return
-            else:
-                ##print("NO")
-                ##plat.sleep_ms(100)
-                pass
+            iterations += 1
+            pin = dio is None or self.dio_edges != dio or self._spi.is_int()
+            if pin and (self.readreg(addr) & mask) == value: break
+            elapsed = plat.ticks_diff(plat.ticks_us(), start)
+            if elapsed > timeout_us:
+                self.count_wait(site, iterations, elapsed, True)
+                raise self.WaitTimeout("%s: reg %02X & %02X != %02X after %dus"
+                                       % (site, addr, mask, value, elapsed))
+            if not pin:
+                plat.idle()  # until an interrupt, e.g. the DIO0 edge
+            elif poll_us != 0:
+                plat.sleep_us(poll_us)
+                poll_us = min(poll_us * 2, self.WAIT_POLL_MAX_US)
+
+        self.count_wait(site, iterations, plat.ticks_diff(plat.ticks_us(), start), False)
+
+    def count_wait(self, site:str, iterations:int, elapsed:int, timedout:bool) -> None:
+        """Add a completed (or timed out) wait to the stats for its call site"""
+        stat = self.waitstats.get(site)
+        if stat is None:
+            stat = self.waitstats[site] = [0, 0, 0, 0, 0]
+        stat[0] += 1                                # calls
+        stat[1] += iterations                       # register/pin polls
+        stat[2] += elapsed                          # total us
+        if elapsed > stat[3]: stat[3] = elapsed     # max us
+        if timedout: stat[4] += 1                   # timeouts
 
     def writefifo(self, buf) -> None:
         """Send all bytes to the FIFO buffer"""
@@ -343,43 +499,108 @@ class RFM69:
         self._spi.deselect()
 
     def clearfifo(self) -> None:
-        while (self.readreg(self.R_IRQFLAGS2) & self.M_FIFONOTEMPTY) == self.M_FIFONOTEMPTY:
+        for i in range(self.MTU):  # bounded, FIFO can't hold more than this
+            if (self.readreg(self.R_IRQFLAGS2) & self.M_FIFONOTEMPTY) == 0: break
             self.readreg(self.R_FIFO)
 
     def reset(self) -> None:
         self._spi.txing(False)
         self._spi.rxing(False)
         self._spi.reset()
+        self.invalidate()
 
     def setmode(self, mode: int) -> None:
+        self.setmode_start(mode)
+        if mode == self.V_OPMODE_TX:
+            self.wait_tx_ready()
+        else: # e.g. RX, STBY
+            self.wait_ready()
+        self.setmode_done(mode)
+
+    def setmode_start(self, mode: int) -> int:
+        """Request a mode change, returns the IRQFLAGS1 flags that show it is done"""
         self._spi.txing(False)
         self._spi.rxing(False)
 
         self.writereg(self.R_OPMODE, mode)
+        if mode == self.V_OPMODE_TX:
+            return self.M_MODEREADY | self.M_TXREADY
+        return self.M_MODEREADY
 
+    def setmode_done(self, mode: int) -> None:
+        """Complete a mode change, once the chip is ready in that mode"""
         if mode == self.V_OPMODE_TX:
-            self.wait_tx_ready()
             self._spi.txing(True)
-
         elif mode == self.V_OPMODE_RX:
-            self.wait_ready()
             self._spi.rxing(True)
-        else: # e.g. STBY
-            self.wait_ready()
-
         self._mode = mode
 
     def getmode(self):
         return self._mode
 
+    def set_rxmode(self, rxmode:int) -> None:
+        """Poll IRQFLAGS2 over SPI (RX_POLL) or check the DIO0 pin (RX_INT)"""
+        if rxmode == self.RX_INT:
+            # DIO0 mapping 00 is PayloadReady in RX (and PacketSent in TX)
+            dio = self.shadow(self.R_DIOMAPPING1)
+            if dio is None: dio = self.readreg(self.R_DIOMAPPING1)
+            self.writereg(self.R_DIOMAPPING1, dio & 0x3F)
+            self._spi.irq(self._on_dio0_ref)
+        elif self._rxmode == self.RX_INT:
+            self._spi.irq(None)
+        self._rxmode = rxmode
+
+    def rxmode(self) -> int:
+        return self._rxmode
+
+    def link(self):
+        """The SPI link to the chip"""
+        return self._spi
+
+    def irq(self, handler) -> None:
+        """Call handler(pin) when DIO0 rises in RX_INT, or None to stop"""
+        self._handler = handler
+
+    def _on_dio0(self, pin) -> None:
+        # hard IRQ context, count the edge for waitreg(dio=) and pass it on
+        self.dio_edges += 1
+        if self._handler is not None: self._handler(pin)
+
+    def dio(self) -> int or None:
+        """The dio_edges count to pass to waitreg(dio=) now, None if not RX_INT"""
+        if self._rxmode != self.RX_INT: return None
+        return self.dio_edges
+
     def wait_ready(self) -> None:
-        if not plat.MOCKING:
-            self.waitreg(self.R_IRQFLAGS1, self.M_MODEREADY, self.M_MODEREADY)
+        if not self.mocking:
+            self.waitreg(self.R_IRQFLAGS1, self.M_MODEREADY, self.M_MODEREADY, "ready")
 
     def wait_tx_ready(self) -> None:
-        if not plat.MOCKING:
+        if not self.mocking:
             FLAGS = self.M_MODEREADY | self.M_TXREADY
-            self.waitreg(self.R_IRQFLAGS1, FLAGS, FLAGS)
+            self.waitreg(self.R_IRQFLAGS1, FLAGS, FLAGS, "txready")
+
+    def automodes(self, value:int) -> None:
+        """Set R_AUTOMODES, e.g. V_AUTOMODES_TX or V_AUTOMODES_OFF"""
+        # With V_AUTOMODES_TX the chip goes from its current mode (e.g. RX) into
+        # TX once a whole payload is in the FIFO (FIFOTHRESH is len-1), and
+        # back again on PacketSent, with no OPMODE writes or ModeReady waits.
+        # Each packet is then its own TX session, as the chip leaves TX on
+        # PacketSent even if the next one is already in the FIFO.
+        # It is only armed while transmit_burst() sends, as a received frame
+        # longer than FIFOTHRESH raises FifoLevel too, and the chip would turn
+        # to TX in the middle of receiving it.
+        self.writereg(self.R_AUTOMODES, value)
+
+    def wait_auto_done(self) -> None:
+        """Wait for the chip to leave the TX it entered by itself"""
+        # not by DIO0, the chip is back in RX (PayloadReady) right after PacketSent
+        if not self.mocking:
+            try:
+                self.waitreg(self.R_IRQFLAGS1, self.M_AUTOMODE, 0, "autotx")
+            except self.WaitTimeout:
+                self.automodes(self.V_AUTOMODES_OFF)  # don't leave it armed in RX
+                raise
 
     def transmit(self, payload: bytes, times: int) -> None:
         # Note, when PA starts up, radio inserts a 01 at start before any user data
@@ -388,28 +609,64 @@ class RFM69:
         # the first bit of the preamble being twice the length it should be in the
         # first packet.
 
-        # CHECK
-        pllen = len(payload)
-        assert times >= 1 and 1 <= pllen <= 32
-
-        # CONFIGURE
-        # Start transmitting when a full payload is loaded. So for '15':
-        # level triggers when it 'strictly exceeds' level (i.e. 16 bytes starts tx,
-        # and <=15 bytes triggers fifolevel irqflag to be cleared)
-        # We already know from earlier that payloadlen<=32 (which fits into half a FIFO)
-        self.writereg(self.R_FIFOTHRESH, pllen - 1)
+        if len(payload) > self.FIFO_HALF:
+            self.transmit_stream(self.repeat(payload, times))
+        else:
+            self.transmit_burst(((payload, times),))
 
-        # TRANSMIT: Transmit a number of payloads back to back
+    @staticmethod
+    def repeat(payload: bytes, times: int):
+        """A repeat train of a payload, as chunks for transmit_stream()"""
         for i in range(times):
-            self.writefifo(payload)
-            # Tx will auto start when fifolevel is exceeded by loading the payload
-            # so the level register must be correct for the size of the payload
-            # otherwise transmit will never start.
-            # wait for FIFO to not exceed threshold level
-            self.waitreg(self.R_IRQFLAGS2, self.M_FIFOLEVEL, 0)
+            yield payload
+
+    def transmit_stream(self, chunks) -> int:
+        """Transmit any amount of data from an iterable of chunks, returns nbytes"""
+        stream = TxStream(self, chunks)
+        stream.start()
+        while stream.pump(wait=True): pass
+        stream.finish()
+        return stream.nbytes
+
+    def transmit_burst(self, items) -> None:
+        """Transmit a sequence of (payload, times) back to back, in one TX session"""
+        pllen = None
+        packets = 0
+        auto = self.autotx and self._mode == self.V_OPMODE_RX
+        if auto: self.automodes(self.V_AUTOMODES_TX)  # armed for this burst only
+        for payload, times in items:
+            if len(payload) != pllen:
+                if pllen is not None:
+                    # let the FIFO drain before moving the threshold under it
+                    self.waitreg(self.R_IRQFLAGS2, self.M_FIFONOTEMPTY, 0, "fifoempty")
+                self.transmit_start(payload, times)
+                pllen = len(payload)
+            else:
+                assert times >= 1
+
+            # TRANSMIT: Transmit a number of payloads back to back
+            for i in range(times):
+                dio = self.dio()
+                self.writefifo(payload)
+                # Tx will auto start when fifolevel is exceeded by loading the payload
+                # so the level register must be correct for the size of the payload
+                # otherwise transmit will never start.
+                packets += 1
+                if auto:
+                    self.wait_auto_done()  # back in RX after PacketSent
+                else:
+                    # wait for FIFO to not exceed threshold level
+                    self.waitreg(self.R_IRQFLAGS2, self.M_FIFOLEVEL, 0, "fifolevel")
+
+        if auto: self.automodes(self.V_AUTOMODES_OFF)
 
         # WAIT: wait for FIFO empty, to indicate transmission completed
-        self.waitreg(self.R_IRQFLAGS2, self.M_FIFONOTEMPTY, 0)
+        if packets == 1 and dio is not None and not auto and not self.mocking:
+            # PacketSent only rises once per TX session, so it can only mark the
+            # end of a lone packet, but it does so on DIO0 and after the last bit
+            self.waitreg(self.R_IRQFLAGS2, self.M_PACKETSENT, self.M_PACKETSENT, "packetsent", dio=dio)
+        else:
+            self.waitreg(self.R_IRQFLAGS2, self.M_FIFONOTEMPTY, 0, "fifoempty")
 
         # CONFIRM: Was the transmit ok?
         # Check final flags in case of overruns etc
@@ -426,6 +683,19 @@ class RFM69:
         ##    TRACE_FAIL("FIFO not empty or overrun at end of burst")
         ##}
 
+    def transmit_start(self, payload: bytes, times: int) -> None:
+        """Check and configure for a transmit, before loading the FIFO"""
+        # CHECK
+        pllen = len(payload)
+        assert times >= 1 and 1 <= pllen <= 32
+
+        # CONFIGURE
+        # Start transmitting when a full payload is loaded. So for '15':
+        # level triggers when it 'strictly exceeds' level (i.e. 16 bytes starts tx,
+        # and <=15 bytes triggers fifolevel irqflag to be cleared)
+        # We already know from earlier that payloadlen<=32 (which fits into half a FIFO)
+        self.writereg(self.R_FIFOTHRESH, pllen - 1)
+
     def recv_rdy(self) -> bool:
         """Is there something to be received?"""
         if self._rxmode == self.RX_INT:
@@ -436,40 +706,397 @@ class RFM69:
 
     def readfifo_cbp_into(self, rxbuf) -> int:
         """Receive a count byte preceeded block of data"""
-        #NOTE: only call this if you know there is something in the FIFO
-        # clear buffer first, for diags
-        for i in range(len(rxbuf)):
-            rxbuf[i] = 0
-
+        #NOTE: only call this if you know there is something in the FIFO.
+        # In packet mode PayloadReady means the whole payload is in the FIFO
+        # already, so it can be read out in one burst with no waiting.
         self._spi.select()
-        self._spi.byte(self.R_FIFO)  #  prime the burst receiver
+        self._spi.byte(self.R_FIFO)  #  prime the burst receiver
 
         length = self._spi.byte(self.R_FIFO)  # read the length byte
-        if length > len(rxbuf):
+        if length >= len(rxbuf):
             self._spi.deselect()
             print("warning: rxbuf too small, want:%d got:%d" % (length+1, len(rxbuf)))
             self.clearfifo()
             return 0  # NOTDONE
 
-        #SLOW RECEIVE
-        rxbuf[0] = length
-        for i in range(length):
-            b = self._spi.byte(self.R_FIFO)
-            rxbuf[i+1] = b
+        rxbuf[0] = length  # user sees the CBP also
+        if length != 0:
+            self._spi.transfer(self.R_FIFO, memoryview(rxbuf)[1:length+1], select=False)
         self._spi.deselect()
-
         return length+1  # DONE, actual nbytes in buffer including cbp
 
-        #FAST RECEIVE (not working
-        # rxbuf[0] = length  # user sees the CBP also
-        # print("delay for packet")
-        # plat.sleep_ms(250)  # wait for rest of payload to fill buffer
-        # self._spi.transfer(self.R_FIFO, memoryview(rxbuf[1:length]), select=False)
-        # self._spi.deselect()
-        # print("packet apparently received")
-        # return length+1  # DONE, actual length
+#----- TX STREAM ---------------------------------------------------------------
+class TxStream:
+    """Keeps the RFM69 FIFO topped up from an iterable of chunks, while in TX"""
+    # Transmit starts as soon as the FIFO is not empty. FIFOLEVEL is set while
+    # the FIFO holds more than THRESH bytes, so whenever it clears there is
+    # room for at least FIFO_SIZE-THRESH-1 more, which is refilled from the
+    # chunks. Chunks can be any length, and follow on with no gaps.
+    # pump() can be called from the caller's own loop (or a DIO1 FifoLevel
+    # interrupt) so that Python work overlaps the transmit. If both do, the
+    # one that comes second while the other is filling just returns.
+    THRESH = 20
+
+    def __init__(self, rfm, chunks):
+        self._rfm   = rfm
+        self._it    = iter(chunks)
+        self._chunk = None
+        self._pos   = 0
+        self.nbytes = 0      # bytes loaded into the FIFO so far
+        self.loaded = False  # True when all chunks are in the FIFO
+        self._pumping = False
+
+    def start(self) -> None:
+        R = RFM69
+        self._rfm.writereg(R.R_FIFOTHRESH, 0x80 | self.THRESH)  # start when not empty
+        self._fill(R.FIFO_SIZE)  # FIFO is empty before a transmit
+
+    def _fill(self, room:int) -> None:
+        """Load up to room bytes into the FIFO"""
+        while room > 0:
+            if self._chunk is None:
+                try:
+                    self._chunk = memoryview(next(self._it))
+                except StopIteration:
+                    self.loaded = True
+                    return
+                self._pos = 0
+            n = min(room, len(self._chunk) - self._pos)
+            if n > 0:
+                self._rfm.writefifo(self._chunk[self._pos:self._pos+n])
+                self._pos += n
+                self.nbytes += n
+                room -= n
+            if self._pos >= len(self._chunk):
+                self._chunk = None
+
+    def pump(self, wait:bool=False) -> bool:
+        """Refill if the FIFO has drained to threshold, False once all is loaded"""
+        if self.loaded: return False
+        if self._pumping: return True  # the other pump is part way through
+        self._pumping = True
+        try:
+            R = RFM69
+            if wait:
+                self._rfm.waitreg(R.R_IRQFLAGS2, R.M_FIFOLEVEL, 0, "fifolevel")
+            elif (self._rfm.readreg(R.R_IRQFLAGS2) & R.M_FIFOLEVEL) != 0:
+                return True  # still above threshold, nothing to do yet
+            return self.refill()
+        finally:
+            self._pumping = False
+
+    def refill(self) -> bool:
+        """Load the room below threshold, once FIFOLEVEL has cleared"""
+        self._fill(RFM69.FIFO_SIZE - self.THRESH - 1)
+        return not self.loaded
+
+    def finish(self) -> None:
+        """Wait for everything loaded to be sent"""
+        R = RFM69
+        self._rfm.waitreg(R.R_IRQFLAGS2, R.M_FIFONOTEMPTY, 0, "fifoempty")
+
+#----- AIRTIME AND DUTY CYCLE --------------------------------------------------
+class Airtime:
+    """A time-on-air model for an RFM69 configuration table"""
+    XTAL_HZ = 32000000
+
+    def __init__(self, table):
+        R = RFM69
+        regs = {}
+        for reg, value in table:
+            regs[reg] = value
+        get = lambda reg, default: regs.get(reg, default)  # datasheet reset values
+        self.bitrate = self.XTAL_HZ // ((get(R.R_BITRATEMSB, 0x1A) << 8) | get(R.R_BITRATELSB, 0x0B))
+        preamble = (get(R.R_PREAMBLEMSB, 0) << 8) | get(R.R_PREAMBLELSB, 3)
+        syncconfig = get(R.R_SYNCCONFIG, 0x98)
+        sync = (((syncconfig >> 3) & 0x07) + 1) if (syncconfig & 0x80) else 0
+        self.overhead_bits = (preamble + sync) * 8
+        # manchester coding (DcFree=01) sends 2 chips per payload bit
+        self.bits_per_byte = 16 if ((get(R.R_PACKETCONFIG1, 0x10) >> 5) & 0x03) == 1 else 8
+
+    def us(self, nbytes:int, times:int=1) -> int:
+        """Time on air of a payload of nbytes, sent times times"""
+        bits = self.overhead_bits + nbytes * self.bits_per_byte
+        return (bits * 1000000 // self.bitrate) * times
+
+class DutyCycle:
+    """A sliding window airtime accountant, that admits or limits transmissions"""
+    # Airtime is kept in a fixed number of time buckets across the window.
+    REJECT  = 0  # raise DutyCycle.Exceeded if there is not enough budget
+    SHORTEN = 1  # send fewer repeats (at least one) to fit the budget
+    DEFER   = 2  # wait up to max_defer_ms for budget, then reject
+
+    class Exceeded(Exception): pass
+
+    def __init__(self, limit_pct:int=10, window_ms:int=3600000, buckets:int=60,
+                 policy:int=REJECT, max_defer_ms:int=1000):
+        self.limit_us     = window_ms * 10 * limit_pct  # window_ms*1000*pct/100
+        self.window_ms    = window_ms
+        self.policy       = policy
+        self.max_defer_ms = max_defer_ms
+        self._bucket_ms   = window_ms // buckets
+        self._used        = [0] * buckets  # airtime us per bucket
+        self._current     = 0              # bucket being filled
+        self._since       = plat.ticks_ms()  # start of the current bucket
+        self.by_tag       = {}  # tag -> total airtime us, to find who hogs the channel
+        self.sent = self.deferred = self.shortened = self.rejected = 0
+
+    def _advance(self) -> None:
+        """Retire any buckets that have fallen out of the window"""
+        n = plat.ticks_diff(plat.ticks_ms(), self._since) // self._bucket_ms
+        if n <= 0: return
+        used = self._used
+        for i in range(min(n, len(used))):
+            self._current = (self._current + 1) % len(used)
+            used[self._current] = 0
+        self._since = plat.ticks_add(self._since, n * self._bucket_ms)
+
+    def used_us(self) -> int:
+        self._advance()
+        return sum(self._used)
+
+    def remaining_us(self) -> int:
+        return max(0, self.limit_us - self.used_us())
+
+    def admit(self, us_each:int, times:int) -> int:
+        """Number of repeats allowed now, as per the policy"""
+        # blocks for DEFER, async callers use admit_nowait() and sleep themselves
+        start = plat.ticks_ms()
+        while True:
+            allowed, wait_ms = self.admit_nowait(us_each, times, plat.ticks_diff(plat.ticks_ms(), start))
+            if wait_ms == 0: return allowed
+            plat.sleep_ms(wait_ms)
+
+    def admit_nowait(self, us_each:int, times:int, waited_ms:int=0) -> tuple:
+        """(repeats allowed now, 0), or (0, ms to wait before asking again) for DEFER"""
+        # waited_ms is how long this request has already been deferred for
+        if us_each * times <= self.remaining_us(): return times, 0
+
+        if self.policy == self.SHORTEN:
+            allowed = self.remaining_us() // us_each if us_each else times
+            if allowed >= 1:
+                self.shortened += 1
+                return allowed, 0
+
+        elif self.policy == self.DEFER:
+            if waited_ms == 0: self.deferred += 1
+            if waited_ms < self.max_defer_ms:
+                return 0, min(self._bucket_ms, self.max_defer_ms - waited_ms)
+
+        self.rejected += 1
+        raise self.Exceeded("need:%dus remaining:%dus" % (us_each * times, self.remaining_us()))
+
+    def record(self, us:int, tag=None) -> None:
+        """Account for airtime actually used"""
+        self._advance()
+        self._used[self._current] += us
+        self.sent += 1
+        self.charge(tag, us)
+
+    def charge(self, tag, us:int) -> None:
+        """Add us of airtime to the total for tag, if it is not None"""
+        if tag is not None:
+            self.by_tag[tag] = self.by_tag.get(tag, 0) + us
+
+    def metrics(self) -> dict:
+        used = self.used_us()
+        return {
+            "window_ms":    self.window_ms,
+            "limit_us":     self.limit_us,
+            "used_us":      used,
+            "remaining_us": max(0, self.limit_us - used),
+            "sent":         self.sent,
+            "deferred":     self.deferred,
+            "shortened":    self.shortened,
+            "rejected":     self.rejected
+        }
+
+#----- FRAME RING --------------------------------------------------------------
+class FrameRing:
+    """A fixed ring of preallocated frame buffers, with no per-frame allocation"""
+    # The producer claim()s the buffer at the head, fills it and commit()s it.
+    # The consumer peek()s the frame at the tail, and release()s it when done
+    # with it, so a frame stays valid until the consumer asks for the next one.
+    # Only the producer moves head and only the consumer moves tail, so the
+    # producer can safely run from a (soft) interrupt.
+    def __init__(self, size:int, mtu:int):
+        self._bufs   = [bytearray(mtu) for _ in range(size)]
+        self._views  = [memoryview(b) for b in self._bufs]
+        self._lens   = [0] * size
+        self._times  = [0] * size
+        self._wrap   = size * 2  # indexes run 0..2N-1 so full and empty differ
+        self._head   = 0  # next slot to fill
+        self._tail   = 0  # next slot to drain
+        self.overflows = 0  # frames dropped because the consumer fell behind
+
+    def __len__(self) -> int:
+        return (self._head - self._tail) % self._wrap
+
+    def claim(self) -> bytearray or None:
+        """Get the buffer to fill next, or None if the ring is full"""
+        if len(self) == len(self._bufs): return None  # full
+        return self._bufs[self._head % len(self._bufs)]
+
+    def commit(self, length:int, timestamp) -> None:
+        """Publish the claimed buffer as a frame of length bytes"""
+        slot = self._head % len(self._bufs)
+        self._lens[slot]  = length
+        self._times[slot] = timestamp
+        self._head = (self._head + 1) % self._wrap
+
+    def peek(self) -> tuple or None:
+        """Get (memoryview, timestamp) of the oldest frame, or None if empty"""
+        if self._head == self._tail: return None  # empty
+        slot = self._tail % len(self._bufs)
+        return self._views[slot][0:self._lens[slot]], self._times[slot]
+
+    def release(self) -> None:
+        """Discard the oldest frame, making its buffer available for reuse"""
+        if self._head != self._tail:
+            self._tail = (self._tail + 1) % self._wrap
+
+#----- CAPTURE -----------------------------------------------------------------
+class Capture:
+    """An append-only binary capture of received frames, to a file or a RAM ring"""
+    # After the MAGIC header, each record is:
+    #   n(1) t_us(6, little endian, since the capture started) rssi(1) cfg(1) frame(n)
+    # rssi is the raw R_RSSIVALUE (-rssi/2 dBm) and cfg is EnergenieRadio.OOK/FSK,
+    # or 0xFF if the radio was not configured yet.
+    # With no filename the records go to a RAM ring, that drops the oldest.
+    MAGIC = b"ENC1"
+    HEAD  = 9
+
+    def __init__(self, filename:str or None=None, ring_size:int=8192, flush_every:int=16):
+        self._head = bytearray(self.HEAD)
+        self.records = 0  # number captured
+        self.dropped = 0  # number pushed out of the ring
+        self._flush_every = flush_every
+        self._t_us = 0
+        self._last_us = plat.ticks_us()
+        self._last_ms = plat.ticks_ms()
+        if filename is not None:
+            try:
+                import os
+            except ImportError:
+                import uos as os
+            try:
+                new = os.stat(filename)[6] == 0
+            except OSError:
+                new = True
+            self._file = open(filename, "ab")
+            if new: self._file.write(self.MAGIC)
+            self._ring = None
+        else:
+            self._file = None
+            self._ring = bytearray(ring_size)
+            self._end  = 0  # next byte to write
+            self._used = 0
+
+    def _elapsed_us(self) -> int:
+        """us since the capture started, across ticks_us wraps"""
+        now_us, now_ms = plat.ticks_us(), plat.ticks_ms()
+        dus = plat.ticks_diff(now_us, self._last_us)
+        dms = plat.ticks_diff(now_ms, self._last_ms)
+        if abs(dus - dms * 1000) > 2000: dus = dms * 1000  # ticks_us went round
+        self._last_us, self._last_ms = now_us, now_ms
+        self._t_us += dus
+        return self._t_us
+
+    def write(self, frame, nb:int, rssi:int, cfg:int) -> None:
+        """Append a record for the first nb bytes of frame"""
+        head = self._head
+        t = self._elapsed_us()
+        head[0] = nb
+        for i in range(1, 7):
+            head[i] = t & 0xFF
+            t >>= 8
+        head[7] = rssi
+        head[8] = cfg
+        self.records += 1
+        body = memoryview(frame)[0:nb]
+        if self._file is not None:
+            self._file.write(head)
+            self._file.write(body)
+            if self.records % self._flush_every == 0: self._file.flush()
+        elif self.HEAD + nb > len(self._ring):
+            self.dropped += 1  # would never fit
+        else:
+            self._append(head)
+            self._append(body)
+
+    def _append(self, data) -> None:
+        ring, size, n = self._ring, len(self._ring), len(data)
+        while size - self._used < n:  # push out the oldest whole records
+            self._used -= self.HEAD + ring[(self._end - self._used) % size]
+            self.dropped += 1
+        first = min(n, size - self._end)
+        ring[self._end:self._end+first] = data[0:first]
+        if first < n:
+            ring[0:n-first] = data[first:n]
+        self._end = (self._end + n) % size
+        self._used += n
+
+    def dump(self) -> bytes:
+        """The RAM ring as a capture file, oldest record first"""
+        if self._ring is None:
+            raise ValueError("dump() is only for a RAM ring capture, this one writes to a file")
+        start = (self._end - self._used) % len(self._ring)
+        if start + self._used <= len(self._ring):
+            return self.MAGIC + bytes(self._ring[start:start+self._used])
+        return self.MAGIC + bytes(self._ring[start:]) + bytes(self._ring[0:self._end])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def reader(stream):
+        """Yield (t_us, rssi, cfg, frame) from a capture file object"""
+        # frame is a memoryview that is only valid until the next record
+        if stream.read(len(Capture.MAGIC)) != Capture.MAGIC:
+            raise ValueError("Not a capture file")
+        head = bytearray(Capture.HEAD)
+        buf = bytearray(256)
+        view = memoryview(buf)
+        while stream.readinto(head) == Capture.HEAD:
+            n = head[0]
+            if stream.readinto(view[0:n]) != n: return  # cut short
+            t = 0
+            for i in range(6, 0, -1):
+                t = (t << 8) | head[i]
+            yield t, head[7], head[8], view[0:n]
+
+#----- TX QUEUE ----------------------------------------------------------------
+class TxHandle:
+    """A queued transmit, and its completion status after EnergenieRadio.flush()"""
+    PENDING = 0
+    DONE    = 1
+    FAILED  = 2
+
+    def __init__(self, cfg:int, payload:bytes, times:int, gap_ms:int, tag=None):
+        self.cfg     = cfg
+        self.tag     = tag
+        self.payload = payload
+        self.times   = times
+        self.gap_ms  = gap_ms
+        self.status  = self.PENDING
+        self.error   = None
+
+    def done(self) -> bool:
+        return self.status == self.DONE
 
 #----- RADIO -------------------------------------------------------------------
+def exclusive(method):
+    """Mark the radio busy while method runs, so a scheduled drain keeps off SPI"""
+    def guarded(self, *args, **kwargs):
+        self.busy += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.busy -= 1
+    return guarded
+
 class EnergenieRadio:
     """A specific configuration of the RFM69 radio, for Energenie devices"""
     class RadioError(Exception): pass
@@ -478,6 +1105,7 @@ class EnergenieRadio:
     FSK = 1
     FOREVER = 0xFFFFFFFF
     MTU = 66
+    RX_RING = 4  # number of receive buffers for raw_frames() and messages()
 
     # see: https://www.ti.com/lit/an/swra048/swra048.pdf table 9
     # see datasheet table 10
@@ -520,7 +1148,7 @@ class EnergenieRadio:
         (R.R_PAYLOADLEN,    0)                  # No payload length
     )
 
-    FSK_ENERGENIE_CFG = {
+    FSK_ENERGENIE_CFG = (
         # RFM69HCW (high power)
         (R.R_PALEVEL,       V_PABOOST_10_DBM),  # RFM69HCW PA_BOOST PA1 10%duty 25kHz bw max (ANT=PABOOST PIN)
         #RFM69 (low power)
@@ -546,10 +1174,12 @@ class EnergenieRadio:
         ##(R.R_PACKETCONFIG1,0xA2),             # Variable length, Manchester coding, Addr must match NodeAddress
         (R.R_PAYLOADLEN,    MTU),               # max Length in RX, not used in Tx
         (R.R_NODEADRS,      0x06)               # Node address used in address filtering (not used)
-    }
+    )
 
     CFGS = (OOK_ENERGENIE_CFG, FSK_ENERGENIE_CFG)
-    def __init__(self, link=None):
+    AIRTIME = (Airtime(OOK_ENERGENIE_CFG), Airtime(FSK_ENERGENIE_CFG))
+    PROGS = (R.compile(OOK_ENERGENIE_CFG), R.compile(FSK_ENERGENIE_CFG))  # burst writes
+    def __init__(self, link=None, rx_ring:int=RX_RING):
         if link is None:
             link = get_radio_link()
         self._rfm = RFM69(link)
@@ -557,27 +1187,43 @@ class EnergenieRadio:
         self._is_on = False
         self._mode = self._rfm.V_OPMODE_STBY
         self._cfg = None
+        self.cfg_switches = 0  # number of times want_cfg reconfigured the radio
+        self._txq = []  # TxHandle's waiting for flush()
+        self._stream_entry = None  # mode to return to after stream_end()
+        self._capture = None  # Capture of every received frame, if capturing
+        self._auto = False  # chip goes RX->TX->RX by itself around each send
+        self.busy = 0  # foreground users of the SPI bus, see exclusive()
+        self.duty = DutyCycle()  # 10% (PALEVEL 10dBm) in 433.05..434.79MHz
         self._rxbuf = bytearray(self.MTU)
+        self._ring = FrameRing(rx_ring, self.MTU)
+        # bound methods made up front, as the IRQ handler must not allocate
+        self._on_dio0_ref = self._on_dio0
+        self._drain_ref = self._drain
+
+    def rfm(self) -> RFM69:
+        """The underlying RFM69 radio"""
+        return self._rfm
 
     def get_version(self) -> int:
-        if plat.MOCKING: return RFM69.V_VERSION
+        if self._rfm.mocking: return RFM69.V_VERSION
         return self._rfm.readreg(RFM69.R_VERSION)
 
     def loadtable(self, table:tuple) -> None:
-        for entry in table:
-            reg, value = entry
-            self._rfm.writereg(reg, value)
+        # RFM69 shadows registers, so only those that differ are written
+        self._rfm.writeprog(RFM69.compile(table))
 
+    @exclusive
     def want_cfg(self, cfg):
         if self._cfg != cfg:
-            self._configure(self.CFGS[cfg])
+            self._configure(self.PROGS[cfg])
             self._cfg = cfg
+            self.cfg_switches += 1
 
-    def _configure(self, cfg):
+    def _configure(self, prog:tuple):
         rv = self.get_version()
         if rv != RFM69.V_VERSION:
             raise self.RadioError("Unexpected radio version, want:%d got:%d" % (RFM69.V_VERSION, rv))
-        self.loadtable(cfg)
+        self._rfm.writeprog(prog)
         self._configured = True
 
     def is_configured(self) -> bool:
@@ -586,6 +1232,7 @@ class EnergenieRadio:
     def is_on(self) -> bool:
         return self._is_on
 
+    @exclusive
     def on(self):
         if not self.is_configured():
             #radio EN=true
@@ -594,16 +1241,182 @@ class EnergenieRadio:
         self._rfm.setmode(self._rfm.V_OPMODE_STBY)
         self._is_on = True
 
-    def send(self, payload:bytes, times:int=1) -> None:
+    def airtime_us(self, nbytes:int, times:int=1, cfg:int or None=None) -> int:
+        """Time on air to send nbytes times times, in cfg or the current config"""
+        if cfg is None: cfg = self._cfg
+        if cfg is None: return 0  # not configured, nothing goes on air
+        return self.AIRTIME[cfg].us(nbytes, times)
+
+    def auto_rx(self, flag:bool=True) -> None:
+        """Let the chip turn around RX->TX->RX by itself when sending from RX"""
+        # This shrinks the gap after each command in which reports are missed
+        self._rfm.autotx = flag
+        self._auto = flag
+
+    def is_auto_rx(self) -> bool:
+        return self._auto
+
+    def _enter_tx(self, streamed:bool=False) -> int:
+        """Get ready to transmit, returns the mode to restore afterwards"""
+        # AutoModes only starts TX once a whole payload is in the FIFO, so a
+        # streamed send (more than FIFO_HALF) goes by an explicit TX instead.
         entry_mode = self._rfm.getmode()
-        if entry_mode != self._rfm.V_OPMODE_TX:
-            self._rfm.setmode(self._rfm.V_OPMODE_TX)
+        if entry_mode == RFM69.V_OPMODE_RX and self._auto:
+            # the FIFO is shared, so take any received payload out of the way
+            if self._rfm.recv_rdy(): self.rx_poll()
+            if not streamed: return entry_mode
+        if entry_mode != RFM69.V_OPMODE_TX:
+            self._rfm.setmode(RFM69.V_OPMODE_TX)
+        return entry_mode
+
+    @exclusive
+    def send(self, payload:bytes, times:int=1, tag=None) -> None:
+        """Send a payload, within the duty cycle budget (tag identifies the sender)"""
+        us_each = self.airtime_us(len(payload))
+        times = self.duty.admit(us_each, times)
+
+        entry_mode = self._enter_tx(len(payload) > RFM69.FIFO_HALF)
 
         self._rfm.transmit(payload, times)
-
+        self.duty.record(us_each * times, tag)
+        self._restore_mode(entry_mode)
+
+    @exclusive
+    def send_burst(self, items, gap_ms:int=0, tag=None) -> None:
+        """Send several (payload, times) in the current config, in one TX session"""
+        # e.g. a row of legacy sockets, with one guard gap at the end.
+        # The burst is admitted as a whole, so SHORTEN can't drop repeats from
+        # it, and a burst that does not fit is rejected (or deferred) instead.
+        # tag is for the whole burst, or a list with a tag for each item.
+        us = 0
+        for payload, times in items:
+            us += self.airtime_us(len(payload), times)
+        self.duty.admit(us, 1)
+
+        entry_mode = self._enter_tx()
+        self._rfm.transmit_burst(items)
+        if isinstance(tag, list):
+            self.duty.record(us)
+            for (payload, times), t in zip(items, tag):
+                self.duty.charge(t, self.airtime_us(len(payload), times))
+        else:
+            self.duty.record(us, tag)
+        self._restore_mode(entry_mode)
+        if gap_ms != 0:
+            plat.sleep_ms(gap_ms)
+
+    @exclusive
+    def stream_begin(self, chunks, nbytes:int or None=None) -> TxStream:
+        """Start streaming chunks in the current config, call stream.pump() to feed it"""
+        # If the link has DIO1 wired, the FifoLevel interrupt does the pumping.
+        # nbytes (the total to send) is admitted against the duty cycle up
+        # front. Without it, it is summed when chunks is a list or tuple, and
+        # otherwise only the packet overhead is admitted (it is all recorded).
+        if nbytes is None:
+            nbytes = sum(len(c) for c in chunks) if isinstance(chunks, (list, tuple)) else 0
+        self.duty.admit(self.airtime_us(nbytes), 1)
+        self._stream_entry = self._enter_tx(streamed=True)
+        stream = TxStream(self._rfm, chunks)
+        stream.start()
+        link = self._rfm.link()
+        if link.has_fifo_irq():
+            # DIO1 mapping 00 is FifoLevel in TX
+            dio = self._rfm.shadow(RFM69.R_DIOMAPPING1)
+            if dio is None: dio = self._rfm.readreg(RFM69.R_DIOMAPPING1)
+            self._rfm.writereg(RFM69.R_DIOMAPPING1, dio & 0xCF)
+            pump = stream.pump  # bound once, the hard IRQ must not allocate
+            link.fifo_irq(lambda pin: plat.schedule(pump, False))
+        return stream
+
+    @exclusive
+    def stream_end(self, stream:TxStream, tag=None) -> int:
+        """Pump until all chunks are loaded and sent, returns nbytes sent"""
+        link = self._rfm.link()
+        while stream.pump(wait=True): pass
+        stream.finish()
+        if link.has_fifo_irq(): link.fifo_irq(None)
+        self.duty.record(self.airtime_us(stream.nbytes), tag)
+        self._restore_mode(self._stream_entry)
+        return stream.nbytes
+
+    def send_stream(self, chunks, tag=None, nbytes:int or None=None) -> int:
+        """Send any amount of data from an iterable of chunks, returns nbytes sent"""
+        return self.stream_end(self.stream_begin(chunks, nbytes), tag)
+
+    def _restore_mode(self, entry_mode:int) -> None:
         if self._rfm.getmode() != entry_mode:
             self._rfm.setmode(entry_mode)
-
+        elif entry_mode != RFM69.V_OPMODE_RX or not self._auto:
+            return  # with AutoModes, transmit() is already back in RX
+        if self._rfm.rxmode() == RFM69.RX_INT and entry_mode == RFM69.V_OPMODE_RX:
+            self.drain()  # DIO0 edge may have been ignored during TX
+
+    def queue(self, cfg:int, payload:bytes, times:int=1, gap_ms:int=0, tag=None) -> "TxHandle":
+        """Queue a payload to send in cfg (OOK or FSK) at the next flush()"""
+        handle = TxHandle(cfg, payload, times, gap_ms, tag)
+        self._txq.append(handle)
+        return handle
+
+    @exclusive
+    def flush(self) -> int:
+        """Send everything queued, grouped by config, returns number sent ok"""
+        # The current config goes first, then the others in the order they were
+        # first queued, so a mixed batch costs at most two reconfigurations.
+        # The radio stays in TX across all the payloads of a group, and any
+        # gap is timed in TX (an idle OOK transmitter sends no carrier).
+        txq, self._txq = self._txq, []
+        cfgs = []
+        for handle in txq:
+            if handle.cfg not in cfgs: cfgs.append(handle.cfg)
+        if self._cfg in cfgs:
+            cfgs.remove(self._cfg)
+            cfgs.insert(0, self._cfg)
+
+        rfm = self._rfm
+        entry_mode = rfm.getmode()
+        auto = entry_mode == rfm.V_OPMODE_RX and self._auto
+        if auto: self._enter_tx()  # only clears the FIFO, the chip does TX
+        sent = 0
+        for cfg in cfgs:
+            try:
+                if cfg != self._cfg and rfm.getmode() == rfm.V_OPMODE_TX:
+                    rfm.setmode(rfm.V_OPMODE_STBY)  # reconfigure out of TX
+                self.want_cfg(cfg)
+            except Exception as e:  # e.g. RadioError, so nothing left can be sent
+                for handle in txq:
+                    if handle.status == TxHandle.PENDING:
+                        handle.status = TxHandle.FAILED
+                        handle.error = e
+                raise
+            for handle in txq:
+                if handle.cfg != cfg: continue
+                try:
+                    us_each = self.airtime_us(len(handle.payload))
+                    times = self.duty.admit(us_each, handle.times)
+                    if auto and len(handle.payload) > rfm.FIFO_HALF:
+                        # streamed, so by an explicit TX, and back to RX
+                        self._enter_tx(streamed=True)
+                        rfm.transmit(handle.payload, times)
+                        self._restore_mode(entry_mode)
+                    elif auto:
+                        rfm.transmit(handle.payload, times)  # back in RX by AutoModes
+                    else:
+                        if rfm.getmode() != rfm.V_OPMODE_TX:
+                            rfm.setmode(rfm.V_OPMODE_TX)
+                        rfm.transmit(handle.payload, times)
+                    self.duty.record(us_each * times, handle.tag)
+                    if handle.gap_ms != 0:
+                        plat.sleep_ms(handle.gap_ms)
+                    handle.status = TxHandle.DONE
+                    sent += 1
+                except Exception as e:  # e.g. RFM69.WaitTimeout
+                    handle.status = TxHandle.FAILED
+                    handle.error = e
+
+        self._restore_mode(entry_mode)
+        return sent
+
+    @exclusive
     def always_receive(self) -> None:
         """Leave the radio permanently in receive"""
         # This reduces the chance of missing payloads
@@ -611,6 +1424,7 @@ class EnergenieRadio:
         self.want_cfg(radio.FSK)  # we only support FSK receive at present
         self._rfm.setmode(self._rfm.V_OPMODE_RX)
 
+    @exclusive
     def recvinto(self, buffer, wait_ms:int=0) -> int:
         """Try to receive a single payload in the current mode"""
 
@@ -620,28 +1434,52 @@ class EnergenieRadio:
             self._rfm.setmode(self._rfm.V_OPMODE_RX)
 
         # check if there is anything ready to receive
-        if wait_ms is not None and wait_ms > 0:
+        if wait_ms is not None and wait_ms > 0 and self._rfm.rxmode() == RFM69.RX_INT:
+            # idle until the PayloadReady edge on DIO0
+            R = RFM69
+            try:
+                self._rfm.waitreg(R.R_IRQFLAGS2, R.M_PAYLOADREADY, R.M_PAYLOADREADY, "payloadready",
+                                  timeout_us=wait_ms*1000, dio=self._rfm.dio())
+                ready = True
+            except R.WaitTimeout:
+                ready = False
+        elif wait_ms is not None and wait_ms > 0:
             ready = False
-            timeout_ms = plat.now_ms() + wait_ms
+            start = plat.ticks_ms()
             while True:
                 if self._rfm.recv_rdy():
                     ready = True
                     break
-                if plat.now_ms() > timeout_ms: break
+                if plat.ticks_diff(plat.ticks_ms(), start) > wait_ms: break
         else:
             ready = self._rfm.recv_rdy()
 
         total_length = 0
         if ready:
             # Something is ready to be received
+            capture = self._capture
+            if capture is not None: rssi = self._rfm.readreg(RFM69.R_RSSIVALUE)
             total_length = self._rfm.readfifo_cbp_into(buffer)
             # This is a raw buffer, not decrypted, not crc validated
+            if capture is not None and total_length != 0:
+                capture.write(buffer, total_length, rssi, 0xFF if self._cfg is None else self._cfg)
 
         if self._rfm.getmode() != entry_mode:
             self._rfm.setmode(entry_mode)
 
         return total_length  # number of bytes in buffer, including len byte
 
+    def capture(self, filename:str or None=None, ring_size:int=8192) -> Capture:
+        """Capture every received frame, to an append-only file or a RAM ring"""
+        self.capture_stop()
+        self._capture = Capture(filename, ring_size)
+        return self._capture
+
+    def capture_stop(self) -> None:
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
+
     def ot_recv(self, wait_ms:int=0) -> dict or None:
         """Receive, decrypt, and return as a decoded dict"""
         nb = self.recvinto(self._rxbuf, wait_ms)
@@ -651,6 +1489,100 @@ class EnergenieRadio:
         ot_msg = OpenThingsLite.decode(raw_msg)
         return ot_msg  # dict
 
+    def ot_recv_view(self, wait_ms:int=0) -> "OpenThingsView or None":
+        """Receive and decrypt, and return a lazy view over the receive buffer"""
+        nb = self.recvinto(self._rxbuf, wait_ms)
+        if nb is None or nb == 0: return None  # no data
+
+        return OpenThingsView.open(memoryview(self._rxbuf)[0:nb])
+
+    def rx_poll(self, wait_ms:int=0) -> int:
+        """Move a received frame (if any) into the receive ring"""
+        buffer = self._ring.claim()
+        if buffer is None:
+            # ring full, still have to empty the radio FIFO, so drop the frame
+            if self.recvinto(self._rxbuf, wait_ms):
+                self._ring.overflows += 1
+            return 0
+
+        nb = self.recvinto(buffer, wait_ms)
+        if nb:
+            self._ring.commit(nb, plat.now_ms())
+        return nb
+
+    @exclusive
+    def rx_interrupts(self, flag:bool=True) -> None:
+        """Drain received frames into the receive ring from the DIO0 interrupt"""
+        if flag:
+            self._rfm.irq(self._on_dio0_ref)
+            self._rfm.set_rxmode(RFM69.RX_INT)
+            self.drain()  # DIO0 may already be high, and won't rise again
+        else:
+            self._rfm.irq(None)
+            self._rfm.set_rxmode(RFM69.RX_POLL)
+
+    def _on_dio0(self, pin) -> None:
+        # hard IRQ context, so no SPI here, defer to a soft IRQ
+        plat.schedule(self._drain_ref, 0)
+
+    def _drain(self, _) -> None:
+        # A soft IRQ runs between any two bytecodes of the foreground, and the
+        # software mode still reads RX during a mode change or an AutoModes TX,
+        # so leave the SPI bus alone while the foreground is using it at all.
+        if self.busy: return
+        self.drain()
+
+    def drain(self) -> None:
+        """Move all received frames into the receive ring, if in receive"""
+        if self._rfm.getmode() != RFM69.V_OPMODE_RX: return
+        while self._rfm.recv_rdy():
+            if not self.rx_poll(): break
+
+    def rx_ring(self) -> FrameRing:
+        """The receive ring, filled by rx_poll() and the DIO0 drain"""
+        return self._ring
+
+    def overflows(self) -> int:
+        """Number of received frames dropped because the receive ring was full"""
+        return self._ring.overflows
+
+    def raw_frames(self, wait_ms:int or None=None):
+        """Yield (memoryview, timestamp_ms) of raw frames as they are received"""
+        # Each frame is only valid until the next one is asked for.
+        # If wait_ms is not None, stops when nothing is received in that time.
+        if self._rfm.getmode() != self._rfm.V_OPMODE_RX:
+            self.always_receive()
+        ring = self._ring
+        while True:
+            if len(ring) == 0:
+                if self._rfm.rxmode() == RFM69.RX_INT:
+                    # the DIO0 interrupt fills the ring, so just idle until it does,
+                    # but drain here if DIO0 is high with no edge (missed, or busy)
+                    start = plat.ticks_ms()
+                    while len(ring) == 0 and (wait_ms is None or plat.ticks_diff(plat.ticks_ms(), start) <= wait_ms):
+                        if self._rfm.recv_rdy():
+                            self.drain()
+                        else:
+                            plat.idle()
+                else:
+                    self.rx_poll(0 if wait_ms is None else wait_ms)
+                if len(ring) == 0:
+                    if wait_ms is not None: return  # timed out
+                    continue
+
+            yield ring.peek()
+            ring.release()
+
+    def messages(self, wait_ms:int or None=None):
+        """Yield (OpenThingsView, timestamp_ms) of valid received messages"""
+        # The view is reused, and is only valid until the next one is asked for.
+        view = OpenThingsView(None)
+        for frame, timestamp in self.raw_frames(wait_ms):
+            if OpenThingsLite.decrypt(frame):
+                view.bind(frame)
+                yield view, timestamp
+
+    @exclusive
     def off(self):
         self._rfm.setmode(self._rfm.V_OPMODE_STBY)
         #radio EN=False
@@ -658,14 +1590,46 @@ class EnergenieRadio:
 
 #----- SOCKET (Generic) --------------------------------------------------------
 class Socket:
+    CFG    = None  # EnergenieRadio.OOK or EnergenieRadio.FSK
+    TIMES  = 1     # default number of times to send the payload
+    GAP_MS = 0     # silence after sending
+
     def __init__(self, address:int, channel:int=0):
         self._address = address
         self._channel = channel
         if not radio.is_on(): radio.on()
 
-    def set(self, state:bool) -> None:
+    def payload(self, state:bool) -> bytes:
         pass # override in subclass
 
+    def set(self, state:bool, times:int or None=None) -> None:
+        self._send(self.payload(state), times)
+
+    def _send(self, payload:bytes, times:int or None) -> None:
+        radio.want_cfg(self.CFG)
+        radio.send(payload, times=self.TIMES if times is None else times, tag=self._address)
+        if self.GAP_MS != 0:
+            plat.sleep_ms(self.GAP_MS)
+
+    @staticmethod
+    def set_many(sockets, state:bool, times:int or None=None) -> None:
+        """Switch several sockets of the same kind in a single transmit burst"""
+        if len(sockets) == 0: return
+        first = sockets[0]
+        items = []
+        tags = []
+        for socket in sockets:
+            assert socket.CFG == first.CFG
+            items.append((socket.payload(state), socket.TIMES if times is None else times))
+            tags.append(socket._address)
+        radio.want_cfg(first.CFG)
+        radio.send_burst(items, first.GAP_MS, tags)
+
+    def queue(self, state:bool, times:int or None=None) -> TxHandle:
+        """Queue a set() on the radio, to be sent at the next radio.flush()"""
+        return radio.queue(self.CFG, self.payload(state),
+                           self.TIMES if times is None else times, self.GAP_MS, self._address)
+
     def on(self) -> None:
         self.set(True)
 
@@ -677,6 +1641,9 @@ class LegacySocket(Socket):
     """A connector to a remote legacy energenie socket, in OOK mode"""
     ALL = 0                # channel index for 'all switches'
     DEFAULT_ADDR = 0xA0170 # @whaleygeek's hand controller
+    CFG    = EnergenieRadio.OOK
+    TIMES  = 8
+    GAP_MS = 50            # short silence at end to stop switch sticking
 
     @staticmethod
     def switch_to_k(channel: int, state: bool) -> int:
@@ -685,19 +1652,31 @@ class LegacySocket(Socket):
         state = 1 if state else 0  #  to int
         return (0xC, 0xE, 0x6, 0xA, 0x2)[channel] + state
 
+    # HS1527 symbols, each bit is a nibble, so 4 bits of value are 2 bytes
+    LOW  = 0x08  # ^___  short+long
+    HIGH = 0x0E  # ^^^_  long+short
+    NIBBLES = None  # 4 bit value -> 2 encoded bytes, built by LegacySocket.build()
+    PREAMBLE = b'\x80\x00\x00\x00'  # 32 bits
+
     @staticmethod
-    def encode_bits(buf: bytearray, value: int, offset: int, bits: int) -> None:
-        """Encode as per: http://www.sc-tech.cn/en/1527en.htm"""
-        LOW  = 0x08  # ^___  short+long
-        HIGH = 0x0E  # ^^^_  long+short
+    def build() -> None:
+        nibbles = []
+        for v in range(16):
+            buf = bytearray(2)
+            LegacySocket.encode_bits_slow(buf, v, 0, 4)
+            nibbles.append(bytes(buf))
+        LegacySocket.NIBBLES = tuple(nibbles)
 
+    @staticmethod
+    def encode_bits_slow(buf: bytearray, value: int, offset: int, bits: int) -> None:
+        """Encode as per: http://www.sc-tech.cn/en/1527en.htm"""
         mask = 1 << (bits - 1)
 
         for i in range(bits):
             if value & mask:
-                symbol = HIGH
+                symbol = LegacySocket.HIGH
             else:
-                symbol = LOW
+                symbol = LegacySocket.LOW
 
             if (i % 2) == 0:
                 # most significant nibble written first
@@ -708,32 +1687,66 @@ class LegacySocket(Socket):
                 offset += 1
             mask >>= 1
 
+    @staticmethod
+    def encode_bits(buf: bytearray, value: int, offset: int, bits: int) -> None:
+        """Encode as per: http://www.sc-tech.cn/en/1527en.htm, 4 bits per lookup"""
+        if bits % 4 != 0:
+            LegacySocket.encode_bits_slow(buf, value, offset, bits)
+            return
+        nibbles = LegacySocket.NIBBLES  # perf
+        for shift in range(bits-4, -1, -4):
+            buf[offset:offset+2] = nibbles[(value >> shift) & 0x0F]
+            offset += 2
+
     @staticmethod
     def encode_msg(address:int=DEFAULT_ADDR, k:int=0x0F) -> bytes:
         """Pack/encode a 32 bit preamble, 20 bit address, 4 bits of k, into 16 bytes"""
         ##print("encode addr:%08X k:%04X" % (address, k))
         buf = bytearray(16)
-        buf[0:4] = b'\x80\x00\x00\x00'  # [0..3]   preamble, 32 bits
+        buf[0:4] = LegacySocket.PREAMBLE  # [0..3]   preamble, 32 bits
         LegacySocket.encode_bits(buf, address, 4, 20)  # [4..13]  address, 2 bits stored per byte
-        LegacySocket.encode_bits(buf, k, 14, 4)  # [14..15] k, 2 bits stored per byte
+        buf[14:16] = LegacySocket.NIBBLES[k & 0x0F]  # [14..15] k, 2 bits stored per byte
         return buf
 
+    @staticmethod
+    def encode_table(addresses, k:int=0x0F) -> list:
+        """Encode the same k for many addresses (house codes) at once"""
+        tail = LegacySocket.NIBBLES[k & 0x0F]
+        frames = []
+        for address in addresses:
+            buf = bytearray(16)
+            buf[0:4] = LegacySocket.PREAMBLE
+            LegacySocket.encode_bits(buf, address, 4, 20)
+            buf[14:16] = tail
+            frames.append(bytes(buf))
+        return frames
+
     def __init__(self, address:int=DEFAULT_ADDR, channel:int=1):
         Socket.__init__(self, address, channel)
         assert channel in [1,2,3,4]
+        # frames are fixed per socket, so encode them once, [off,on]
+        encode = lambda ch, st: bytes(self.encode_msg(address, self.switch_to_k(ch, st)))
+        self._frames     = (encode(channel, False), encode(channel, True))
+        self._all_frames = (encode(self.ALL, False), encode(self.ALL, True))
+
+    def payload(self, state:bool) -> bytes:
+        return self._frames[1 if state else 0]
+
+    def set_all(self, state:bool, times:int or None=None) -> None:
+        """Switch all channels at this address (channel 0) on or off"""
+        self._send(self._all_frames[1 if state else 0], times)
 
-    def set(self, state:bool, times:int=8) -> None:
-        k = self.switch_to_k(self._channel, state)
-        payload = self.encode_msg(self._address, k)
-        radio.want_cfg(radio.OOK)
-        radio.send(payload, times=times)
-        # short silence at end to stop switch sticking
-        plat.sleep_ms(50)
+LegacySocket.build()
 
 #----- CRC ---------------------------------------------------------------------
 class CRC:
+    """CRC-16 poly 0x1021 initial 0, table driven (one lookup per byte)"""
+    POLY  = 0x1021
+    TABLE = None  # 256 x U16, built by CRC.build()
+
     @staticmethod
-    def calc(buffer) -> int:
+    def calc_bits(buffer) -> int:
+        """Reference bit-at-a-time implementation, used to build/check the table"""
         length = len(buffer)
         crcsum = 0
         for idx in range(length):
@@ -741,13 +1754,39 @@ class CRC:
             for b in range(8):
                 if (crcsum & 0x8000) != 0:
                     # high bit is set
-                    crcsum = (crcsum<<1) ^ 0x1021
+                    crcsum = (crcsum<<1) ^ CRC.POLY
                 else:
                     # high bit is clear
                     crcsum <<= 1
             crcsum &= 0xFFFF  # keep as U16
         return crcsum
 
+    @staticmethod
+    def build() -> None:
+        from array import array
+        table = array("H", [0]*256)
+        for i in range(256):
+            table[i] = CRC.calc_bits((i,))
+        CRC.TABLE = table
+
+    @staticmethod
+    def update(crcsum:int, chunk) -> int:
+        """Fold a chunk of bytes into a running crcsum, returns new crcsum"""
+        table = CRC.TABLE  # perf
+        for b in chunk:
+            crcsum = ((crcsum<<8) & 0xFFFF) ^ table[(crcsum>>8) ^ b]
+        return crcsum
+
+    @staticmethod
+    def calc(buffer) -> int:
+        return CRC.update(0, buffer)
+
+    @staticmethod
+    def calc_many(frames) -> list:
+        """Calculate the crcsum of each buffer in a sequence of buffers"""
+        update = CRC.update  # perf
+        return [update(0, frame) for frame in frames]
+
     @staticmethod
     def sign(buffer) -> None:
         """Set last two bytes of buffer to CRC of rest of buffer"""
@@ -763,14 +1802,87 @@ class CRC:
         if buffer[-1] != (crc      & 0xFF): return False  # LSB
         return True
 
+CRC.build()
+
 #----- CRYPT -------------------------------------------------------------------
 class Crypt:
+    """OpenThings LFSR stream cipher, with an LRU cache of keystreams"""
+    # The keystream only depends on the seed (pid,pip), so the first MTU bytes
+    # of it are cached per seed, and bulk crypts are then just an XOR.
+    STREAM_LEN  = EnergenieRadio.MTU
+    cache_bytes = 4 * STREAM_LEN  # memory ceiling for the cache, 0 disables it
+    hits        = 0
+    misses      = 0
+    _cache      = {}  # seed(int) -> (keystream(bytearray), ran after keystream)
+    _lru        = []  # seeds, least recently used first
+
     def __init__(self, pid:int, pip:int):
         self._ran = ((pid<<8) ^ pip) & 0xFFFF  # keep as U16
+        self._pos = 0
+        self._ks  = None
+        entry = Crypt._lookup(self._ran)
+        if entry is not None:
+            # engine state continues from the end of the cached keystream
+            self._ks, self._ran = entry
+
+    @staticmethod
+    def _generate(ran:int) -> tuple:
+        ks = bytearray(Crypt.STREAM_LEN)
+        for idx in range(Crypt.STREAM_LEN):
+            for i in range(5):
+                if (ran & 0x01) != 0:
+                    ran = (ran>>1) ^ 0xF5F5
+                else:
+                    ran >>= 1
+            ks[idx] = (ran ^ 0x5A) & 0xFF
+        return ks, ran
+
+    @staticmethod
+    def _lookup(seed:int) -> tuple or None:
+        """Get the cached keystream for this seed, generating it on a miss"""
+        if Crypt.cache_bytes < Crypt.STREAM_LEN: return None  # disabled
+        lru = Crypt._lru
+        entry = Crypt._cache.get(seed)
+        if entry is not None:
+            Crypt.hits += 1
+            if lru[-1] != seed:
+                lru.remove(seed)
+                lru.append(seed)
+            return entry
+
+        Crypt.misses += 1
+        entry = Crypt._generate(seed)
+        Crypt._cache[seed] = entry
+        lru.append(seed)
+        Crypt._trim()
+        return entry
+
+    @staticmethod
+    def _trim() -> None:
+        while len(Crypt._lru) * Crypt.STREAM_LEN > Crypt.cache_bytes:
+            del Crypt._cache[Crypt._lru.pop(0)]
+
+    @staticmethod
+    def cache_limit(nbytes:int) -> None:
+        """Set the memory ceiling of the keystream cache, evicting if necessary"""
+        Crypt.cache_bytes = nbytes
+        Crypt._trim()
+
+    @staticmethod
+    def cache_clear() -> None:
+        Crypt._cache.clear()
+        del Crypt._lru[:]
+        Crypt.hits = 0
+        Crypt.misses = 0
 
     def byte(self, data:int) -> int:
         """Crypt a single byte of data, and update crypto engine state"""
-        ran = self._ran  # perf
+        ks, pos = self._ks, self._pos
+        if ks is not None and pos < len(ks):
+            self._pos = pos + 1
+            return (ks[pos] ^ data) & 0xFF
+
+        ran = self._ran  # perf
         for i in range(5):
             if (ran & 0x01) != 0:
                 # bit 0 is set
@@ -784,10 +1896,62 @@ class Crypt:
 
     def block(self, block):
         """Encrypt a range of bytes in place, by modifying the payload bytes"""
-        for idx in range(len(block)):
+        ks, pos, n = self._ks, self._pos, len(block)
+        if ks is not None and pos + n <= len(ks):
+            # fast path, XOR with the cached keystream
+            for idx in range(n):
+                block[idx] ^= ks[pos+idx]
+            self._pos = pos + n
+            return block
+
+        for idx in range(n):
             block[idx] = self.byte(block[idx])
         return block
 
+    def decrypt_verify(self, body) -> bool:
+        """Decrypt in place and check the trailing CRC, in a single pass"""
+        n = len(body) - 2
+        if n < 0: return False
+        table = CRC.TABLE  # perf
+        crcsum = 0
+        ks, pos = self._ks, self._pos
+        if ks is not None and pos + n <= len(ks):
+            for idx in range(n):
+                b = body[idx] ^ ks[pos+idx]
+                body[idx] = b
+                crcsum = ((crcsum<<8) & 0xFFFF) ^ table[(crcsum>>8) ^ b]
+            self._pos = pos + n
+        else:
+            for idx in range(n):
+                b = self.byte(body[idx])
+                body[idx] = b
+                crcsum = ((crcsum<<8) & 0xFFFF) ^ table[(crcsum>>8) ^ b]
+
+        msb = body[n]   = self.byte(body[n])
+        lsb = body[n+1] = self.byte(body[n+1])
+        return msb == (crcsum>>8) and lsb == (crcsum & 0xFF)
+
+    def sign_encrypt(self, body) -> None:
+        """Set the trailing CRC and encrypt in place, in a single pass"""
+        n = len(body) - 2
+        table = CRC.TABLE  # perf
+        crcsum = 0
+        ks, pos = self._ks, self._pos
+        if ks is not None and pos + n <= len(ks):
+            for idx in range(n):
+                b = body[idx]
+                crcsum = ((crcsum<<8) & 0xFFFF) ^ table[(crcsum>>8) ^ b]
+                body[idx] = b ^ ks[pos+idx]
+            self._pos = pos + n
+        else:
+            for idx in range(n):
+                b = body[idx]
+                crcsum = ((crcsum<<8) & 0xFFFF) ^ table[(crcsum>>8) ^ b]
+                body[idx] = self.byte(b)
+
+        body[n]   = self.byte(crcsum>>8)     # MSB
+        body[n+1] = self.byte(crcsum & 0xFF) # LSB
+
 #----- OPEN THINGS LITE --------------------------------------------------------
 byte0 = lambda v: v       & 0xFF
 byte1 = lambda v: (v>>8)  & 0xFF
@@ -1188,109 +2352,235 @@ class OpenThingsLite: #TODO: now OpenThings (not lite)
         buffer[OpenThingsLite.SWITCH_VALUE_IDX]    = 1 if state else 0
 
         body = memoryview(buffer)[OpenThingsLite.HEADER_LEN:]
-        CRC.sign(body)
-
-        ##print("unencrypted version:%s" % hexstr(buffer))
-        Crypt(OpenThingsLite.CRYPT_PID, OpenThingsLite.CRYPT_PIP).block(body)
+        Crypt(OpenThingsLite.CRYPT_PID, OpenThingsLite.CRYPT_PIP).sign_encrypt(body)
 
         ##print("encrypted version:%s" % hexstr(buffer))
         return bytes(buffer)
 
     @staticmethod
-    def decode(buffer) -> dict or None:
-        """Decode an OpenThings message header into a dict"""
-
+    def decrypt(buffer, warn:bool=True) -> bool:
+        """Decrypt a raw message in place, True if it is long enough and CRC ok"""
         MIN_LEN = OpenThingsLite.HEADER_LEN + 3 + 1 + 2  # sensorid+NUL+CRC
         if len(buffer) < MIN_LEN:
-            print("warning: short payload, min:%d got:%d" % (MIN_LEN, len(buffer)))
-            return None  #NODATA
+            if warn: print("warning: short payload, min:%d got:%d" % (MIN_LEN, len(buffer)))
+            return False  #NODATA
 
-        # DECRYPT
+        # DECRYPT AND VERIFY CRC
         encryptPIP = (buffer[OpenThingsLite.CRYPT_IDX]<<8) | buffer[OpenThingsLite.CRYPT_IDX+1]
         #NOTE decrypt is in place, need to take a copy?
         body = memoryview(buffer)[OpenThingsLite.HEADER_LEN:]
         #NOTE: this is an in-place decrypt
-        Crypt(OpenThingsLite.CRYPT_PID, encryptPIP).block(body)
-
-        # VERIFY CRC
-        if not CRC.verify(body):
-            print("warning: payload has invalid CRC: %s" % hexstr(buffer))
-            return None  #NODATA
+        if not Crypt(OpenThingsLite.CRYPT_PID, encryptPIP).decrypt_verify(body):
+            if warn: print("warning: payload has invalid CRC: %s" % hexstr(buffer))
+            return False  #NODATA
+        return True
 
-        # DECODE HEADER (5)
-        length    = buffer[0]                               #0x0D
-        mfrid     = buffer[1]                               #0x04
-        productid = buffer[2]                               #0x02
-        #pipH[3] pipL[4]                                    #0xnnnn
-        header = {
-            "mfrid": mfrid,
-            "productid": productid
+    @staticmethod
+    def decode(buffer) -> dict or None:
+        """Decode an OpenThings message header into a dict"""
+        # The dict form is only defined in one place, OpenThingsView.to_dict()
+        view = OpenThingsView.open(buffer)
+        if view is None: return None  #NODATA
+        return view.to_dict()
+
+#----- OPEN THINGS (no alloc) --------------------------------------------------
+class OTRecord:
+    """A single record of a decoded message, refers back to the message buffer"""
+    __slots__ = ("buffer", "offset", "wr", "paramid", "typeid", "length")
+
+    def __init__(self):
+        self.buffer  = None
+        self.offset  = 0
+        self.wr      = False
+        self.paramid = 0
+        self.typeid  = 0
+        self.length  = 0
+
+    # names, units and renderings are only made when asked for
+    def paramname(self) -> str:
+        return Parameter.paramname_for(self.paramid)
+
+    def paramunit(self) -> str:
+        return Parameter.unitname_for(self.paramid)
+
+    def typename(self) -> str:
+        return Parameter.typename_for(self.typeid)
+
+    def load(self, buffer, i:int) -> int:
+        """Fill from the record at buffer[i], returns index of the next record"""
+        param = buffer[i]
+        self.buffer  = buffer
+        self.wr      = ((param & 0x80) == 0x80)
+        self.paramid = param & 0x7F
+        self.typeid  = buffer[i+1] & 0xF0
+        self.length  = buffer[i+1] & 0x0F
+        self.offset  = i+2
+        return self.offset + self.length
+
+    def valuebytes(self):
+        return memoryview(self.buffer)[self.offset:self.offset+self.length]
+
+    def value(self):
+        return Value.decode(self.valuebytes(), self.typeid, self.length)
+
+    def to_dict(self) -> dict:
+        """Same form as a record of OpenThingsLite.decode()"""
+        rec = {
+            "wr":         self.wr,
+            "paramid":    self.paramid,
+            "paramname":  self.paramname(),
+            "paramunit":  self.paramunit(),
+            "typeid":     self.typeid,
+            "typename":   self.typename(),
+            "length":     self.length
         }
+        if self.length != 0:
+            valuebytes = self.valuebytes()
+            rec["valuebytes"] = hexstr(valuebytes)
+            try:
+                rec["value"] = self.value()
+            except Exception as e:
+                # soft fail
+                print("warning: Can't decode valuebytes:%s due to:%s" % (hexstr(valuebytes), str(e)))
+        return rec
+
+class OTMessage:
+    """A decoded message, with a fixed set of preallocated records"""
+    MAX_RECS = (EnergenieRadio.MTU - 10) // 2  # smallest record is 2 bytes
+    __slots__ = ("buffer", "length", "mfrid", "productid", "sensorid", "nrecs", "recs")
+
+    def __init__(self):
+        self.buffer    = None
+        self.length    = 0
+        self.mfrid     = 0
+        self.productid = 0
+        self.sensorid  = None
+        self.nrecs     = 0
+        self.recs      = [OTRecord() for _ in range(self.MAX_RECS)]
+
+    def records(self):
+        """Iterate over the records in use"""
+        recs = self.recs
+        for i in range(self.nrecs):
+            yield recs[i]
+
+    def find(self, paramid:int) -> OTRecord or None:
+        recs = self.recs
+        for i in range(self.nrecs):
+            if recs[i].paramid == paramid: return recs[i]
+        return None  # NOT FOUND
+
+    def to_dict(self) -> dict:
+        """Same form as OpenThingsLite.decode()"""
+        return OpenThingsView(memoryview(self.buffer)[:self.length]).to_dict()
+
+class OTDecoder:
+    """Decode into a reusable pool of preallocated OTMessage objects"""
+    # A message refers to the (decrypted) buffer it was decoded from, so it is
+    # only valid until that buffer or that pool entry is reused.
+    def __init__(self, size:int=2):
+        self._pool = [OTMessage() for _ in range(size)]
+        self._next = 0
+
+    def decode(self, buffer, msg:OTMessage or None=None) -> OTMessage or None:
+        """Decrypt and decode into msg, or the oldest pool entry if msg is None"""
+        if not OpenThingsLite.decrypt(buffer):
+            return None  #NODATA
 
-        # DECODE BODY
-        # [567]  sensorid(3)                                #0x000373
-        data_len = length - 10
-        if data_len >= 3:
-            sensorid = buffer[5]<<16 | buffer[6]<<8 | buffer[7]
-            header["sensorid"] = sensorid
+        if msg is None:
+            msg = self._pool[self._next]
+            self._next = (self._next + 1) % len(self._pool)
 
-        # DECODE SPECIFIC RECORDS
-        # [8..]  data(length-10)
-        #   switch:
-        #     [8]paramid+rdwr (WR|PARAM_SWITCH_STATE)       0x80 + 0x73
-        #     [9]type&len (UINT|1)                          0x00 + 0x01
-        #     [A]value(0|1)                                 0x00 or 0x01
-        #   [B]NUL(0)                                       0x00
-        # [CD]crc[2]                                        0xnnnn
+        length = buffer[0]
+        msg.buffer    = buffer
+        msg.length    = len(buffer)
+        msg.mfrid     = buffer[1]
+        msg.productid = buffer[2]
+        msg.sensorid  = (buffer[5]<<16 | buffer[6]<<8 | buffer[7]) if length >= 13 else None
 
         i = 8
-        recs = []
+        n = 0
+        recs = msg.recs
+        while i < length and buffer[i] != 0 and n < len(recs):
+            i = recs[n].load(buffer, i)
+            n += 1
+        msg.nrecs = n
+        return msg
 
-        while i < length and buffer[i] != 0:
-            # PARAM
-            param = buffer[i]
-            wr = ((param & 0x80) == 0x80)
-            paramid = param & 0x7F
-            i += 1
+class OpenThingsView:
+    """A lazy view over a decrypted message, fields are parsed when read"""
+    # Like OTMessage, only valid until the underlying buffer is reused.
+    def __init__(self, buffer):
+        self._buf = buffer
+        self._rec = OTRecord()  # cursor reused by records() and find()
 
-            # TYPE/LEN
-            typeid = buffer[i] & 0xF0
-            vlen   = buffer[i] & 0x0F
-            i += 1
+    def bind(self, buffer) -> None:
+        """Reuse this view for a different decrypted buffer"""
+        self._buf = buffer
 
-            rec = {
-                "wr":         wr,
-                "paramid":    paramid,
-                "paramname":  Parameter.paramname_for(paramid),
-                "paramunit":  Parameter.unitname_for(paramid),
-                "typeid":     typeid,
-                "typename":   Parameter.typename_for(typeid),
-                "length":     vlen
-            }
-
-            # VALUE
-            if vlen != 0:
-                valuebytes = memoryview(buffer)[i:i+vlen]
-                rec["valuebytes"] = hexstr(valuebytes)
-                i += vlen
-                try:
-                    rec["value"] = Value.decode(valuebytes, typeid, vlen)
-                except Exception as e:
-                    # soft fail
-                    print("warning: Can't decode valuebytes:%s due to:%s" % (hexstr(valuebytes), str(e)))
-            # store rec
-            recs.append(rec)
-
-        msg = {
-            "type":    "OpenThings.Lite",
-            "header":  header,
-            "recs":    recs,
-            "rawbytes": hexstr(buffer)
+    @staticmethod
+    def open(buffer) -> "OpenThingsView or None":
+        """Decrypt a raw message in place and view it, None if not valid"""
+        if not OpenThingsLite.decrypt(buffer):
+            return None  #NODATA
+        return OpenThingsView(buffer)
+
+    def mfrid(self) -> int:
+        return self._buf[1]
+
+    def productid(self) -> int:
+        return self._buf[2]
+
+    def sensorid(self) -> int or None:
+        buf = self._buf
+        if buf[0] < 13: return None
+        return buf[5]<<16 | buf[6]<<8 | buf[7]
+
+    def records(self):
+        """Iterate the records, the same cursor object is yielded each time"""
+        buf = self._buf
+        length = buf[0]
+        rec = self._rec
+        i = 8
+        while i < length and buf[i] != 0:
+            i = rec.load(buf, i)
+            yield rec
+
+    def find(self, paramid:int) -> OTRecord or None:
+        """Find the first record for paramid, only the record headers are read"""
+        buf = self._buf
+        length = buf[0]
+        i = 8
+        while i < length:
+            param = buf[i]
+            if param == 0: break
+            if (param & 0x7F) == paramid:
+                self._rec.load(buf, i)
+                return self._rec
+            i += 2 + (buf[i+1] & 0x0F)
+        return None  # NOT FOUND
+
+    def to_dict(self) -> dict:
+        """The dict form of a message, as returned by OpenThingsLite.decode()"""
+        header = {
+            "mfrid": self.mfrid(),
+            "productid": self.productid()
+        }
+        sensorid = self.sensorid()
+        if sensorid is not None:
+            header["sensorid"] = sensorid
+        return {
+            "type":     "OpenThings.Lite",
+            "header":   header,
+            "recs":     [rec.to_dict() for rec in self.records()],
+            "rawbytes": hexstr(self._buf)
         }
-        return msg
 
 #----- MIHOME SOCKET -----------------------------------------------------------
 class MiHomeSocket(Socket):
+    CFG   = EnergenieRadio.FSK
+    TIMES = 4
+
     def __init__(self, address:int, channel:int=0):
         Socket.__init__(self, address, channel)
         self._on_message  = self._make_switch_message(address, True)
@@ -1300,12 +2590,145 @@ class MiHomeSocket(Socket):
     def _make_switch_message(address:int, state:bool) -> bytes:
         return OpenThingsLite.make_switch_message(address, state)
 
-    def set(self, state:bool, times:int=4) -> None:
-        radio.want_cfg(radio.FSK)
-        if state:
-            radio.send(self._on_message, times=times)
-        else:
-            radio.send(self._off_message, times=times)
+    def payload(self, state:bool) -> bytes:
+        return self._on_message if state else self._off_message
+
+#----- INSTRUMENTATION ---------------------------------------------------------
+class Stat:
+    """Calls, bytes moved, and time spent, at one instrumented call site"""
+    __slots__ = ("calls", "nbytes", "total_us", "min_us", "max_us", "hist")
+    # hist[i] counts calls taking less than 16<<(2*i) us, the last is the rest
+    HIST = 8
+
+    def __init__(self):
+        self.hist = [0] * self.HIST
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = self.nbytes = self.total_us = self.min_us = self.max_us = 0
+        for i in range(self.HIST): self.hist[i] = 0
+
+    def add(self, us:int, nbytes:int) -> None:
+        if self.calls == 0 or us < self.min_us: self.min_us = us
+        if us > self.max_us: self.max_us = us
+        self.calls += 1
+        self.nbytes += nbytes
+        self.total_us += us
+        i, limit = 0, 16
+        while us >= limit and i < self.HIST-1:
+            limit <<= 2
+            i += 1
+        self.hist[i] += 1
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "bytes": self.nbytes, "us": self.total_us,
+                "min_us": self.min_us, "max_us": self.max_us, "hist": list(self.hist)}
+
+class Instruments:
+    """Counters and timers on the SPI, register, radio and decode hot paths"""
+    # enable() wraps the probed methods of one radio (and its link, and
+    # OpenThingsLite.decode), and disable() puts the originals back, so that
+    # nothing at all is spent on instrumentation while it is disabled.
+    #   probes = Instruments(radio); probes.enable(); ...; probes.snapshot()
+    PROBES = ("spi.transfer", "spi.byte", "rfm.readreg", "rfm.writereg", "rfm.waitreg",
+              "rfm.setmode", "radio.send", "radio.recvinto", "radio.want_cfg", "ot.decode")
+    _FMT_HEAD = "<BB"        # version, number of probes
+    _FMT_STAT = "<BIQQII8I"  # probe index, calls, bytes, us, min_us, max_us, hist
+    VERSION = 2  # 2: bytes is 64 bit, a long capture passes 4GiB
+
+    def __init__(self, radio:"EnergenieRadio" or None=None):
+        self._radio = radio
+        self.stats = {}
+        for name in self.PROBES: self.stats[name] = Stat()
+        self._undo = []  # (obj, attr, original or None if it was not on obj)
+
+    def enabled(self) -> bool:
+        return len(self._undo) != 0
+
+    def enable(self) -> None:
+        if self.enabled(): return
+        target = radio if self._radio is None else self._radio  # module radio by default
+        rfm = target.rfm()
+        link = rfm.link()
+        self._wrap(link, "transfer", "spi.transfer",
+                   lambda r, tx=None, rx=None, select=True:
+                       len(rx) if tx is None or isinstance(tx, int) else len(tx))
+        self._wrap(link, "byte", "spi.byte", lambda r, tx_byte: 1)
+        self._wrap(rfm, "readreg", "rfm.readreg")
+        self._wrap(rfm, "writereg", "rfm.writereg")
+        self._wrap(rfm, "waitreg", "rfm.waitreg")
+        self._wrap(rfm, "setmode", "rfm.setmode")
+        self._wrap(target, "send", "radio.send",
+                   lambda r, payload, times=1, tag=None: len(payload) * times)
+        self._wrap(target, "recvinto", "radio.recvinto", lambda r, buffer, wait_ms=0: r)
+        self._wrap(target, "want_cfg", "radio.want_cfg")
+        self._wrap(OpenThingsLite, "decode", "ot.decode", lambda r, buffer: len(buffer), static=True)
+
+    def disable(self) -> None:
+        while self._undo:
+            obj, attr, original = self._undo.pop()
+            if original is None: delattr(obj, attr)
+            else: setattr(obj, attr, original)
+
+    def _wrap(self, obj, attr:str, name:str, sizer=None, static:bool=False) -> None:
+        fn = getattr(obj, attr)
+        stat = self.stats[name]
+        ticks_us, ticks_diff = plat.ticks_us, plat.ticks_diff
+        def probe(*args, **kwargs):
+            start = ticks_us()
+            result = fn(*args, **kwargs)
+            stat.add(ticks_diff(ticks_us(), start),
+                     0 if sizer is None else sizer(result, *args, **kwargs))
+            return result
+        original = obj.__dict__.get(attr)  # None if it comes from the class
+        self._undo.append((obj, attr, original))
+        setattr(obj, attr, staticmethod(probe) if static else probe)
+
+    def reset(self) -> None:
+        for name in self.PROBES: self.stats[name].reset()
+
+    def snapshot(self) -> dict:
+        """name -> stat dict, for the probes that have been called"""
+        result = {}
+        for name in self.PROBES:
+            stat = self.stats[name]
+            if stat.calls != 0: result[name] = stat.to_dict()
+        return result
+
+    def snapshot_bytes(self) -> bytes:
+        """A compact binary snapshot, of the probes that have been called"""
+        try:
+            import struct
+        except ImportError:
+            import ustruct as struct
+        parts = []
+        for i, name in enumerate(self.PROBES):
+            s = self.stats[name]
+            if s.calls != 0:
+                parts.append(struct.pack(self._FMT_STAT, i, s.calls, s.nbytes, s.total_us,
+                                         s.min_us, s.max_us, *s.hist))
+        return struct.pack(self._FMT_HEAD, self.VERSION, len(parts)) + b"".join(parts)
+
+    @staticmethod
+    def parse(data) -> dict:
+        """Turn a snapshot_bytes() back into a snapshot() dict"""
+        try:
+            import struct
+        except ImportError:
+            import ustruct as struct
+        I = Instruments
+        version, count = struct.unpack_from(I._FMT_HEAD, data, 0)
+        if version != I.VERSION:
+            raise ValueError("Unknown snapshot version:%d" % version)
+        offset = struct.calcsize(I._FMT_HEAD)
+        size = struct.calcsize(I._FMT_STAT)
+        result = {}
+        for _ in range(count):
+            v = struct.unpack_from(I._FMT_STAT, data, offset)
+            offset += size
+            result[I.PROBES[v[0]]] = {"calls": v[1], "bytes": v[2], "us": v[3],
+                                      "min_us": v[4], "max_us": v[5], "hist": list(v[6:])}
+        return result
 
 radio = EnergenieRadio()
 
@@ -0,0 +1,233 @@
+# energenie_async.py  18/10/2026 - uasyncio/asyncio front end for energenie
+
+try:
+    import uasyncio as asyncio  # PICO
+except ImportError:
+    import asyncio  # HOST
+
+import plat
+import energenie
+from energenie import RFM69, TxStream, OpenThingsLite, OpenThingsView
+
+if hasattr(asyncio, "sleep_ms"):
+    sleep_ms = asyncio.sleep_ms
+else:
+    sleep_ms = lambda ms: asyncio.sleep(ms/1000)
+sleep_us = lambda us: asyncio.sleep(us/1000000)  # to the nearest ms on uasyncio
+
+#----- ASYNC RADIO -------------------------------------------------------------
+class RadioLock:
+    """An asyncio.Lock that also marks the radio busy while it is held"""
+    # so that a scheduled DIO0 drain keeps off the SPI bus, even across awaits
+    def __init__(self, radio):
+        self._radio = radio
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self._lock.acquire()
+        self._radio.busy += 1
+        return self
+
+    async def __aexit__(self, *args):
+        self._radio.busy -= 1
+        self._lock.release()
+
+class AsyncEnergenieRadio:
+    """An EnergenieRadio that yields to other tasks at every wait"""
+    # Each send, and each receive poll, holds a lock so that tasks sharing
+    # the radio (and the DIO0 drain) don't interleave SPI traffic. Configuration changes have no
+    # waits in them, so use the wrapped radio for those directly.
+    POLL_MS = 1  # how long to sleep between receive polls
+
+    def __init__(self, radio=None):
+        self.radio = energenie.radio if radio is None else radio
+        self._rfm = self.radio.rfm()
+        self._lock = RadioLock(self.radio)
+
+    async def waitreg(self, addr:int, mask:int, value:int, site:str="waitreg",
+                      timeout_us:int or None=None) -> None:
+        """As RFM69.waitreg, but sleeps between polls so other tasks can run"""
+        # with the same backoff, from WAIT_POLL_US doubling up to WAIT_POLL_MAX_US
+        rfm = self._rfm
+        if timeout_us is None: timeout_us = rfm.WAIT_TIMEOUT_US
+        start = plat.ticks_us()
+        poll_us = rfm.WAIT_POLL_US
+        iterations = 0
+        while True:
+            iterations += 1
+            if (rfm.readreg(addr) & mask) == value: break
+            elapsed = plat.ticks_diff(plat.ticks_us(), start)
+            if elapsed > timeout_us:
+                rfm.count_wait(site, iterations, elapsed, True)
+                raise RFM69.WaitTimeout("%s: reg %02X & %02X != %02X after %dus"
+                                        % (site, addr, mask, value, elapsed))
+            await sleep_us(poll_us)
+            poll_us = min(poll_us * 2, rfm.WAIT_POLL_MAX_US)
+        rfm.count_wait(site, iterations, plat.ticks_diff(plat.ticks_us(), start), False)
+
+    async def setmode(self, mode:int) -> None:
+        flags = self._rfm.setmode_start(mode)
+        if not self._rfm.mocking:
+            await self.waitreg(RFM69.R_IRQFLAGS1, flags, flags,
+                               "txready" if mode == RFM69.V_OPMODE_TX else "ready")
+        self._rfm.setmode_done(mode)
+
+    async def transmit(self, payload:bytes, times:int) -> None:
+        rfm = self._rfm
+        if len(payload) > RFM69.FIFO_HALF:
+            await self.transmit_stream(RFM69.repeat(payload, times))
+            return
+        rfm.transmit_start(payload, times)
+        auto = rfm.autotx and rfm.getmode() == RFM69.V_OPMODE_RX
+        if auto: rfm.automodes(RFM69.V_AUTOMODES_TX)  # armed for this send only
+        try:
+            for i in range(times):
+                rfm.writefifo(payload)
+                if auto:
+                    if not rfm.mocking:  # each packet is its own TX session
+                        await self.waitreg(RFM69.R_IRQFLAGS1, RFM69.M_AUTOMODE, 0, "autotx")
+                else:
+                    await self.waitreg(RFM69.R_IRQFLAGS2, RFM69.M_FIFOLEVEL, 0, "fifolevel")
+        finally:
+            if auto: rfm.automodes(RFM69.V_AUTOMODES_OFF)
+        await self.waitreg(RFM69.R_IRQFLAGS2, RFM69.M_FIFONOTEMPTY, 0, "fifoempty")
+
+    async def transmit_stream(self, chunks) -> int:
+        """As RFM69.transmit_stream, but yields while the FIFO drains"""
+        stream = TxStream(self._rfm, chunks)
+        stream.start()
+        while not stream.loaded:
+            await self.waitreg(RFM69.R_IRQFLAGS2, RFM69.M_FIFOLEVEL, 0, "fifolevel")
+            stream.refill()
+        await self.waitreg(RFM69.R_IRQFLAGS2, RFM69.M_FIFONOTEMPTY, 0, "fifoempty")
+        return stream.nbytes
+
+    async def admit(self, us_each:int, times:int) -> int:
+        """As DutyCycle.admit, but a DEFER sleeps without blocking other tasks"""
+        duty = self.radio.duty
+        start = plat.ticks_ms()
+        while True:
+            allowed, wait_ms = duty.admit_nowait(us_each, times, plat.ticks_diff(plat.ticks_ms(), start))
+            if wait_ms == 0: return allowed
+            await sleep_ms(wait_ms)
+
+    async def send(self, payload:bytes, times:int=1, cfg:int or None=None, tag=None) -> None:
+        """Send a payload, optionally switching to cfg (OOK or FSK) first"""
+        rfm = self._rfm
+        async with self._lock:
+            if cfg is not None:
+                self.radio.want_cfg(cfg)
+            us_each = self.radio.airtime_us(len(payload))
+            times = await self.admit(us_each, times)
+            entry_mode = rfm.getmode()
+            auto = entry_mode == RFM69.V_OPMODE_RX and self.radio.is_auto_rx()
+            if auto:
+                if rfm.recv_rdy(): self.radio.rx_poll()  # FIFO is shared with RX
+                # streamed, by an explicit TX, AutoModes needs the whole payload in the FIFO
+                auto = len(payload) <= RFM69.FIFO_HALF
+            if not auto and entry_mode != RFM69.V_OPMODE_TX:
+                await self.setmode(RFM69.V_OPMODE_TX)
+
+            await self.transmit(payload, times)
+            self.radio.duty.record(us_each * times, tag)
+
+            if auto or rfm.getmode() != entry_mode:
+                if not auto:  # with AutoModes, transmit() is already back in RX
+                    await self.setmode(entry_mode)
+                if rfm.rxmode() == RFM69.RX_INT and entry_mode == RFM69.V_OPMODE_RX:
+                    self.radio.rx_poll()  # DIO0 edge may have been ignored during TX
+
+    async def peek(self, wait_ms:int or None=0) -> tuple or None:
+        """(memoryview, timestamp_ms) of the oldest received frame, None if none in wait_ms"""
+        # Frames are only ever taken from the radio's receive ring, as by
+        # EnergenieRadio.raw_frames(), so the ones moved there by the DIO0
+        # drain or around a send are seen (and captured) too. The frame stays
+        # at the head of the ring until release().
+        rfm = self._rfm
+        ring = self.radio.rx_ring()
+        start = plat.ticks_ms()
+        while True:
+            if len(ring) == 0:
+                async with self._lock:
+                    entry_mode = rfm.getmode()
+                    if entry_mode != RFM69.V_OPMODE_RX:
+                        await self.setmode(RFM69.V_OPMODE_RX)
+
+                    if rfm.recv_rdy(): self.radio.rx_poll()
+
+                    if rfm.getmode() != entry_mode:
+                        await self.setmode(entry_mode)
+
+            if len(ring) != 0: return ring.peek()
+            if wait_ms is not None and plat.ticks_diff(plat.ticks_ms(), start) >= wait_ms:
+                return None  # timed out
+            await sleep_ms(self.POLL_MS)
+
+    def release(self) -> None:
+        """Done with the frame from peek()"""
+        self.radio.rx_ring().release()
+
+    async def recvinto(self, buffer, wait_ms:int or None=0) -> int:
+        """Receive a single payload, waiting up to wait_ms (None is forever)"""
+        frame = await self.peek(wait_ms)
+        if frame is None: return 0  # timed out
+        nb = len(frame[0])
+        buffer[0:nb] = frame[0]
+        self.release()
+        return nb
+
+    def messages(self, wait_ms:int or None=None) -> "AsyncMessages":
+        """async for view in radio.messages(): ..."""
+        return AsyncMessages(self, wait_ms)
+
+class AsyncMessages:
+    """Async iterator of valid received messages, as a reused OpenThingsView"""
+    # The view is over the frame in the receive ring, so is only valid until
+    # the next one is asked for.
+    # If wait_ms is not None, stops when nothing is received in that time.
+    def __init__(self, aradio:AsyncEnergenieRadio, wait_ms:int or None=None):
+        self._aradio  = aradio
+        self._wait_ms = wait_ms
+        self._held    = False  # the previous frame is still at the head of the ring
+        self._view    = OpenThingsView(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> OpenThingsView:
+        aradio = self._aradio
+        while True:
+            if self._held:
+                aradio.release()
+                self._held = False
+            peeked = await aradio.peek(self._wait_ms)
+            if peeked is None: raise StopAsyncIteration
+            self._held = True
+            frame = peeked[0]
+            if OpenThingsLite.decrypt(frame):
+                self._view.bind(frame)
+                return self._view
+
+#----- ASYNC SOCKET ------------------------------------------------------------
+class AsyncSocket:
+    """Async front end for any energenie Socket"""
+    def __init__(self, socket, aradio:AsyncEnergenieRadio or None=None):
+        self._socket = socket
+        self._aradio = radio if aradio is None else aradio
+
+    async def set(self, state:bool, times:int or None=None) -> None:
+        s = self._socket
+        await self._aradio.send(s.payload(state), s.TIMES if times is None else times, s.CFG,
+                                s._address)
+        if s.GAP_MS != 0:
+            await sleep_ms(s.GAP_MS)
+
+    async def on(self) -> None:
+        await self.set(True)
+
+    async def off(self) -> None:
+        await self.set(False)
+
+radio = AsyncEnergenieRadio()  # shares energenie.radio
+
+#END: energenie_async.py
@@ -0,0 +1,53 @@
+# fake_link.py  18/10/2026 - a quiet fake SPI radio link for host tests
+
+import plat
+from energenie import RFM69
+
+class FakeLink:
+    """Just enough of an SPI radio link to receive a queue of frames, for host tests"""
+    def __init__(self, frames=()):
+        self.frames = list(frames)
+        self._fifo = None
+        self.intpin = plat.Pin(0, plat.Pin.IN)  # emulated DIO0
+        self.writes = 0
+
+    def transfer(self, tx=None, rx=None, select:bool=True) -> None:
+        if select and tx is not None and not isinstance(tx, int) and tx[0] & 0x80:
+            self.writes += 1
+        if isinstance(tx, int):  # burst read of the FIFO
+            for i in range(len(rx)):
+                rx[i] = next(self._fifo)
+        elif rx is not None and tx is not None and tx[0] == RFM69.R_IRQFLAGS2:
+            rx[1] = RFM69.M_PAYLOADREADY if self.frames else 0
+
+    def select(self) -> None:
+        self._fifo = None
+
+    def byte(self, tx_byte:int) -> int:
+        if tx_byte & 0x80:  # address byte of a burst write
+            self.writes += 1
+            return 0
+        if self._fifo is None:  # address byte primes the FIFO burst
+            self._fifo = iter(self.frames.pop(0))
+            return 0
+        return next(self._fifo)
+
+    def deselect(self) -> None:
+        # DIO0 (PayloadReady) stays asserted while there are frames to read
+        if self._fifo is not None:
+            self.intpin(1 if self.frames else 0)
+
+    def inject(self, frame) -> None:
+        """A frame arrives over the air"""
+        self.frames.append(frame)
+        self.intpin(1)
+
+    def reset(self): pass
+    def power(self, flag=True): pass
+    def is_int(self): return self.intpin() == 1
+    def irq(self, handler): self.intpin.irq(handler, plat.Pin.IRQ_RISING)
+    def has_fifo_irq(self): return False
+    def txing(self, flag): pass
+    def rxing(self, flag): pass
+
+#END: fake_link.py
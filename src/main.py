@@ -39,18 +39,24 @@ def test_receive_raw():
             raw_msg = memoryview(buffer)[0:nb]
             print("raw msg:%s" % energenie.hexstr(raw_msg))
 
+def test_capture():
+    """Capture every received frame to an append-only file, for offline decoding"""
+    print("test_capture")
+    radio = energenie.radio
+    capture = radio.capture("capture.bin")
+    for frame, timestamp in radio.raw_frames():
+        print("captured:%d" % capture.records)
+
 def test_receive_ot():
     """Receive a raw payload and print it"""
     print("test_receive_ot")
     radio = energenie.radio
 
-    radio.always_receive()
-    while True:
-        decoded = radio.ot_recv()
-        if decoded is not None:
-            print(decoded)
+    for view, timestamp in radio.messages():
+        print(view.to_dict())
 
 test_switching()
 
 #test_receive_raw()
-#test_receive_ot()
\ No newline at end of file
+#test_receive_ot()
+#test_capture()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# ot_batch.py  18/10/2026 - batch decrypt and CRC check of captured frames (host only)
+#
+# For offline analysis of many frames at once. With numpy, the keystream for
+# each distinct PIP is generated once (the LFSR stepped for all PIPs together),
+# every frame is decrypted with one XOR, and the CRC of every row is run a byte
+# column at a time. Without numpy the same results come from Crypt and CRC.
+# Results match Crypt.decrypt_verify() bit for bit, either way.
+
+import io
+from energenie import EnergenieRadio, OpenThingsLite, CRC, Capture
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MTU        = EnergenieRadio.MTU
+HEADER_LEN = OpenThingsLite.HEADER_LEN
+MIN_LEN    = HEADER_LEN + 3 + 1 + 2  # sensorid+NUL+CRC, as OpenThingsLite.decrypt()
+
+def load_capture(data) -> tuple:
+    """(frames, lengths, t_us, rssi) of a capture file's bytes, frames as (N, MTU)"""
+    records = [(t, rssi, bytes(frame)) for t, rssi, cfg, frame in Capture.reader(io.BytesIO(data))]
+    if np is None:
+        return ([bytearray(f.ljust(MTU, b"\0")) for t, r, f in records], [len(f) for t, r, f in records],
+                [t for t, r, f in records], [r for t, r, f in records])
+    frames = np.zeros((len(records), MTU), dtype=np.uint8)
+    for i, (t, rssi, frame) in enumerate(records):
+        frames[i, :len(frame)] = np.frombuffer(frame, dtype=np.uint8)
+    return (frames, np.array([len(f) for t, r, f in records], dtype=np.int64),
+            np.array([t for t, r, f in records], dtype=np.int64),
+            np.array([r for t, r, f in records], dtype=np.uint8))
+
+def decrypt_verify(frames, lengths) -> tuple:
+    """Decrypt and CRC check a batch of raw frames, lengths include the length byte
+
+    frames is an (N, MTU) uint8 array, or a sequence of bytes-like rows.
+    returns (valid, sensorid, productid, plain). sensorid is -1 unless the frame
+    is valid and long enough to have one. numpy arrays with numpy, otherwise lists.
+    """
+    if np is None:
+        return decrypt_verify_python(frames, lengths)
+    return decrypt_verify_numpy(frames, lengths)
+
+def decrypt_verify_python(frames, lengths) -> tuple:
+    valid, sensorid, productid, plain = [], [], [], []
+    for frame, nb in zip(frames, lengths):
+        buf = bytearray(bytes(frame))
+        ok = nb <= len(buf) and OpenThingsLite.decrypt(memoryview(buf)[0:nb], warn=False)
+        valid.append(ok)
+        sensorid.append((buf[5]<<16 | buf[6]<<8 | buf[7]) if ok and buf[0] >= 13 else -1)
+        productid.append(buf[2])
+        plain.append(buf)
+    return valid, sensorid, productid, plain
+
+def keystreams(pips):
+    """(len(pips), MTU-HEADER_LEN) keystreams, one per PIP"""
+    ran = ((OpenThingsLite.CRYPT_PID << 8) ^ pips.astype(np.uint32)) & 0xFFFF
+    ks = np.empty((len(pips), MTU - HEADER_LEN), dtype=np.uint8)
+    for idx in range(ks.shape[1]):
+        for i in range(5):
+            ran = np.where(ran & 1, (ran >> 1) ^ 0xF5F5, ran >> 1)
+        ks[:, idx] = (ran ^ 0x5A) & 0xFF
+    return ks
+
+def decrypt_verify_numpy(frames, lengths) -> tuple:
+    if not isinstance(frames, np.ndarray):  # rows of bytes, as decrypt_verify_python takes
+        frames = np.frombuffer(b"".join(bytes(f).ljust(MTU, b"\0") for f in frames), dtype=np.uint8)
+        frames = frames.reshape(-1, MTU)
+    frames  = frames.astype(np.uint8, copy=False)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    rows, width = frames.shape
+    ok_len = (lengths >= MIN_LEN) & (lengths <= width)
+
+    # DECRYPT: body bytes only, of frames long enough to have a CRC
+    pips = (frames[:, 3].astype(np.uint32) << 8) | frames[:, 4]
+    upips, inverse = np.unique(pips, return_inverse=True)
+    ks = keystreams(upips)[:, :width - HEADER_LEN]
+    inside = (np.arange(width - HEADER_LEN)[None, :] < (lengths - HEADER_LEN)[:, None]) & ok_len[:, None]
+    plain = frames.copy()
+    plain[:, HEADER_LEN:] ^= np.where(inside, ks[inverse.reshape(-1)], 0).astype(np.uint8)
+
+    # CRC: one table lookup per byte column, for all the rows still in their body
+    table = np.array(CRC.TABLE, dtype=np.uint32)
+    ncrc = lengths - HEADER_LEN - 2
+    crc = np.zeros(rows, dtype=np.uint32)
+    for j in range(int(ncrc.max(initial=0))):
+        b = plain[:, HEADER_LEN + j].astype(np.uint32)
+        crc = np.where(j < ncrc, ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b], crc)
+
+    at = np.clip(HEADER_LEN + ncrc, 0, width - 2)
+    index = np.arange(rows)
+    valid = ok_len & (plain[index, at] == (crc >> 8)) & (plain[index, at + 1] == (crc & 0xFF))
+
+    sensorid = np.where(valid & (frames[:, 0] >= 13),
+                        (plain[:, 5].astype(np.int64) << 16) | (plain[:, 6].astype(np.int64) << 8)
+                        | plain[:, 7], -1)
+    productid = frames[:, 2].astype(np.int64)  # the header is not encrypted
+    return valid, sensorid, productid, plain
+
+#END: ot_batch.py
@@ -2,13 +2,59 @@
 
 try:
     # PICO
-    from utime import sleep_ms, ticks_ms
+    from utime import sleep_ms, sleep_us, ticks_ms, ticks_us, ticks_diff, ticks_add
+    from micropython import schedule
+    from machine import idle
     now_ms = ticks_ms
     MOCKING = False
 
 except ImportError:
     #HOST
-    from time import sleep, time
+    from time import sleep, time, monotonic
     sleep_ms = lambda d: sleep(d/1000)
+    sleep_us = lambda d: sleep(d/1000000)
     now_ms   = lambda :  time()*1000
+    schedule = lambda fn, arg: fn(arg)  # no soft IRQs, so run it now
+    idle     = lambda :  sleep(0.001)
     MOCKING = True
+
+    # ticks wrap like they do on MicroPython, so only use ticks_diff/ticks_add
+    _TICKS_PERIOD = 1<<30
+    _TICKS_MASK   = _TICKS_PERIOD-1
+    ticks_ms = lambda : int(monotonic()*1000) & _TICKS_MASK
+    ticks_us = lambda : int(monotonic()*1000000) & _TICKS_MASK
+    ticks_add = lambda t, delta: (t + delta) & _TICKS_MASK
+
+    def ticks_diff(end:int, start:int) -> int:
+        """Signed difference end-start, correct across one wraparound"""
+        d = (end - start) & _TICKS_MASK
+        if d >= _TICKS_PERIOD//2: d -= _TICKS_PERIOD
+        return d
+
+    class Pin:
+        """Host emulation of enough of machine.Pin to drive pin interrupts"""
+        IN, OUT = 0, 1
+        IRQ_FALLING, IRQ_RISING = 4, 8
+
+        def __init__(self, id=None, mode=IN, value=0):
+            self._id = id
+            self._value = value
+            self._handler = None
+            self._trigger = 0
+
+        def irq(self, handler=None, trigger=IRQ_RISING) -> None:
+            self._handler = handler
+            self._trigger = trigger
+
+        def value(self, v=None) -> int or None:
+            if v is None: return self._value
+            v = 1 if v else 0
+            was, self._value = self._value, v
+            if self._handler is not None and v != was:
+                if (v and (self._trigger & self.IRQ_RISING)) \
+                        or (not v and (self._trigger & self.IRQ_FALLING)):
+                    self._handler(self)
+
+        __call__ = value
+        def on(self) -> None:  self.value(1)
+        def off(self) -> None: self.value(0)
@@ -0,0 +1,312 @@
+# sim_rfm69.py  18/10/2026 - a register level RFM69 emulator, as a host link
+
+import plat
+from energenie import RFM69, Airtime
+
+class DIO0(plat.Pin):
+    """The emulated DIO0 pin, brought up to date whenever it is read"""
+    # so that code that only watches the pin (e.g. an RX_INT idle loop) sees it rise
+    def __init__(self, sim):
+        plat.Pin.__init__(self, 0, plat.Pin.IN)
+        self._sim = sim
+
+    def value(self, v=None):
+        if v is None: self._sim.tick()
+        return plat.Pin.value(self, v)
+
+    __call__ = value
+
+class SimulatedRFM69:
+    """An SPI radio link backed by an emulated RFM69, for running on the host"""
+    # Models the register file, the 66 byte FIFO and its thresholds, the
+    # IRQFLAGS1/2 flags, DIO0 (mapping 00), AutoModes, mode changes that take
+    # time to become ready, and packets that take their airtime at the
+    # configured bitrate. Received frames are injected with inject().
+    #
+    # Simulated time follows the host clock scaled by speed, and only moves on
+    # when the link is used (an SPI transaction, reading DIO0 or tick()), so
+    # that flags and DIO0 never change in the middle of a transaction.
+    ACCURATE = True  # RFM69 does not need to skip its waits on this link
+
+    SLEEP, STBY, FS, TX, RX = 0x00, 0x04, 0x08, 0x0C, 0x10
+    LATENCY_US = {SLEEP:0, STBY:100, FS:60, TX:120, RX:1700}  # to ModeReady
+
+    # registers that matter to the model, at their datasheet reset values
+    RESET = ((RFM69.R_OPMODE, 0x04), (RFM69.R_BITRATEMSB, 0x1A), (RFM69.R_BITRATELSB, 0x0B),
+             (RFM69.R_VERSION, RFM69.V_VERSION), (RFM69.R_PREAMBLELSB, 0x03),
+             (RFM69.R_SYNCCONFIG, 0x98), (RFM69.R_PACKETCONFIG1, 0x10),
+             (RFM69.R_PAYLOADLEN, 0x40), (RFM69.R_FIFOTHRESH, 0x8F))
+    AIRTIME_REGS = (RFM69.R_BITRATEMSB, RFM69.R_BITRATELSB, RFM69.R_PREAMBLEMSB,
+                    RFM69.R_PREAMBLELSB, RFM69.R_SYNCCONFIG, RFM69.R_PACKETCONFIG1)
+
+    def __init__(self, speed:float=1.0):
+        self.speed  = speed
+        self.intpin = DIO0(self)
+        self.sent   = []  # payloads transmitted, as bytes
+        self.airtime_us = 0  # total time spent transmitting
+        self.transactions = 0
+        self.rx_lost = 0    # injected frames not received
+        self.underruns = 0  # packets cut short by an empty FIFO
+        self.now_us = 0  # simulated time
+        self._air = []   # [start us, end us, frame] injected and not landed
+        self._last = plat.ticks_us()
+        self.reset()
+
+    #----- LINK ----------------------------------------------------------------
+    def reset(self) -> None:
+        """Hard reset, all registers to their reset values"""
+        self.regs = bytearray(0x80)
+        for reg, value in self.RESET:
+            self.regs[reg] = value
+        self._fifo = bytearray()
+        self._overrun = False
+        self._packet_sent = False
+        self._payload_ready = False
+        self._mode = self.STBY
+        self._ready_at = self.now_us
+        self._rx_since = None  # when RX became ready
+        self._auto = False     # in the AutoModes intermediate mode
+        # while sending: [next byte due us, bytes left, payload, us per byte, start us]
+        self._tx = None
+        self._addr = None
+        self._write = False
+        self.intpin(0)
+
+    def power(self, flag=True) -> None: pass
+    def txing(self, flag) -> None: pass
+    def rxing(self, flag) -> None: pass
+    def has_fifo_irq(self) -> bool: return False
+
+    def select(self) -> None:
+        self.transactions += 1
+        self._advance()
+        self._addr = None
+
+    def deselect(self) -> None:
+        self._addr = None
+        self._dio0()
+
+    def byte(self, tx_byte:int) -> int:
+        if self._addr is None:  # address byte
+            self._addr  = tx_byte & 0x7F
+            self._write = (tx_byte & 0x80) != 0
+            return 0
+        addr = self._addr
+        if addr != RFM69.R_FIFO: self._addr = (addr + 1) & 0x7F
+        if self._write:
+            self._wr(addr, tx_byte)
+            return 0
+        return self._rd(addr)
+
+    def transfer(self, tx=None, rx=None, select:bool=True) -> None:
+        if select: self.select()
+        if isinstance(tx, int):
+            for i in range(len(rx)): rx[i] = self.byte(tx)
+        elif tx is not None:
+            if rx is None:
+                for b in tx: self.byte(b)
+            else:
+                for i in range(len(tx)): rx[i] = self.byte(tx[i])
+        else:
+            for i in range(len(rx)): rx[i] = self.byte(0x00)
+        if select: self.deselect()
+
+    def is_int(self) -> bool:
+        return self.intpin() == 1
+
+    def irq(self, handler) -> None:
+        self.intpin.irq(handler, plat.Pin.IRQ_RISING)
+
+    #----- AIR -----------------------------------------------------------------
+    def tick(self) -> None:
+        """Bring the emulation up to date, and DIO0 with it"""
+        self._advance()
+        self._dio0()
+
+    def inject(self, frame, delay_us:int=0) -> None:
+        """A frame (length byte first) starts to arrive over the air after delay_us"""
+        self._advance()
+        start = self.now_us + delay_us
+        self._air.append([start, start + self._airtime().us(len(frame)), bytes(frame)])
+
+    def _airtime(self) -> Airtime:
+        return Airtime([(reg, self.regs[reg]) for reg in self.AIRTIME_REGS])
+
+    #----- REGISTERS -----------------------------------------------------------
+    def _rd(self, addr:int) -> int:
+        R = RFM69
+        if addr == R.R_FIFO:
+            if len(self._fifo) == 0: return 0
+            b = self._fifo[0]
+            del self._fifo[0]
+            if len(self._fifo) == 0: self._payload_ready = False
+            return b
+        if addr == R.R_IRQFLAGS1:
+            flags = 0
+            if self._ready():
+                flags = R.M_MODEREADY
+                if self._mode == self.RX: flags |= R.M_RXREADY
+                if self._mode == self.TX: flags |= R.M_TXREADY
+            if self._auto: flags |= R.M_AUTOMODE
+            return flags
+        if addr == R.R_IRQFLAGS2:
+            n = len(self._fifo)
+            flags = 0
+            if n >= R.FIFO_SIZE: flags |= R.M_FIFOFULL
+            if n != 0:           flags |= R.M_FIFONOTEMPTY
+            if self._fifolevel(): flags |= R.M_FIFOLEVEL
+            if self._overrun:    flags |= R.M_FIFOOVERRUN
+            if self._packet_sent: flags |= R.M_PACKETSENT
+            if self._payload_ready: flags |= R.M_PAYLOADREADY | R.M_CRCOK
+            return flags
+        return self.regs[addr]
+
+    def _wr(self, addr:int, value:int) -> None:
+        R = RFM69
+        if addr == R.R_FIFO:
+            level, notempty = self._fifolevel(), len(self._fifo) != 0
+            if len(self._fifo) >= R.FIFO_SIZE:
+                self._overrun = True
+            else:
+                self._fifo.append(value)
+            self._autoenter(level, notempty)
+        elif addr == R.R_IRQFLAGS2:
+            if value & R.M_FIFOOVERRUN:  # writing 1 clears the FIFO
+                self._fifo = bytearray()
+                self._overrun = False
+                self._payload_ready = False
+        elif addr == R.R_IRQFLAGS1 or addr == R.R_VERSION:
+            pass  # read only, or cleared by the chip
+        else:
+            self.regs[addr] = value
+            if addr == R.R_OPMODE and not self._auto:
+                self._setmode(value & 0x1C)
+
+    def _fifolevel(self) -> bool:
+        return len(self._fifo) > (self.regs[RFM69.R_FIFOTHRESH] & 0x7F)
+
+    #----- MODES ---------------------------------------------------------------
+    def _ready(self) -> bool:
+        return self.now_us >= self._ready_at
+
+    def _setmode(self, mode:int) -> None:
+        if mode == self._mode: return
+        if self._mode == self.TX:
+            if self._tx is not None: self._finish_packet()  # cut short
+            self._packet_sent = False
+        if mode == self.SLEEP:
+            self._fifo = bytearray()
+            self._payload_ready = False
+        self._rx_since = None
+        self._mode = mode
+        self._ready_at = self.now_us + self.LATENCY_US.get(mode, 0)
+
+    def _autoenter(self, level:bool, notempty:bool) -> None:
+        """Check the AutoModes enter condition after the FIFO fills (written or received)"""
+        automodes = self.regs[RFM69.R_AUTOMODES]
+        enter = automodes >> 5
+        if self._auto or enter == 0: return
+        if (enter == 1 and not notempty and len(self._fifo) != 0) \
+                or (enter == 2 and not level and self._fifolevel()):
+            self._auto = True
+            self._setmode((self.SLEEP, self.STBY, self.RX, self.TX)[automodes & 0x03])
+
+    def _autoexit(self) -> None:
+        self._auto = False
+        self._setmode(self.regs[RFM69.R_OPMODE] & 0x1C)
+
+    #----- TIME ----------------------------------------------------------------
+    def _advance(self) -> None:
+        now = plat.ticks_us()
+        until = self.now_us + int(plat.ticks_diff(now, self._last) * self.speed)
+        self._last = now
+        while True:
+            t = self._next_event()
+            if t is None or t > until: break
+            self.now_us = max(self.now_us, t)
+            self._event()
+        self.now_us = until
+
+    def _next_event(self) -> int or None:
+        times = []
+        if not self._ready():
+            times.append(self._ready_at)
+        elif self._mode == self.TX:
+            if self._tx is not None: times.append(self._tx[0])
+            elif self._can_start(): times.append(self.now_us)
+        for frame in self._air:
+            times.append(frame[1])
+        return min(times) if times else None
+
+    def _can_start(self) -> bool:
+        if len(self._fifo) == 0: return False
+        if self.regs[RFM69.R_FIFOTHRESH] & 0x80: return True  # FifoNotEmpty
+        return self._fifolevel()
+
+    def _event(self) -> None:
+        """Run whatever is due at now_us"""
+        now = self.now_us
+        if self._ready() and self._mode == self.RX and self._rx_since is None:
+            self._rx_since = self._ready_at
+
+        for frame in self._air:
+            if frame[1] <= now:
+                self._air.remove(frame)
+                self._land(frame[0], frame[2])
+                return
+
+        if not self._ready() or self._mode != self.TX: return
+        tx = self._tx
+        if tx is None:
+            if not self._can_start(): return
+            airtime = self._airtime()
+            packetconfig1 = self.regs[RFM69.R_PACKETCONFIG1]
+            nbytes = (self._fifo[0] + 1) if packetconfig1 & 0x80 else self.regs[RFM69.R_PAYLOADLEN]
+            self._packet_sent = False
+            self._tx = [now + airtime.overhead_bits * 1000000 // airtime.bitrate, nbytes,
+                        bytearray(), airtime.bits_per_byte * 1000000 // airtime.bitrate, now]
+        elif tx[1] == 0:
+            self._finish_packet()
+        elif len(self._fifo) == 0:
+            self.underruns += 1
+            self._finish_packet()
+        else:
+            tx[2].append(self._fifo[0])  # byte moves to the shift register
+            del self._fifo[0]
+            tx[1] -= 1
+            tx[0] += tx[3]
+
+    def _finish_packet(self) -> None:
+        tx, self._tx = self._tx, None
+        self.sent.append(bytes(tx[2]))
+        self.airtime_us += self.now_us - tx[4]
+        self._packet_sent = True
+        if self._auto and ((self.regs[RFM69.R_AUTOMODES] >> 2) & 0x07) == 6:
+            self._autoexit()  # exit on PacketSent
+
+    def _land(self, start:int, frame:bytes) -> None:
+        """A frame has finished arriving"""
+        # it is only heard if RX was ready before it started, and the
+        # previous payload has been read out of the FIFO
+        if self._mode != self.RX or self._rx_since is None or self._rx_since > start \
+                or len(self._fifo) != 0:
+            self.rx_lost += 1
+            return
+        level, notempty = self._fifolevel(), len(self._fifo) != 0
+        self._fifo = bytearray(frame)
+        self._payload_ready = True
+        self._autoenter(level, notempty)  # received bytes raise FifoLevel too
+
+    def _dio0(self) -> None:
+        """DIO0 mapping 00 is PayloadReady in RX and PacketSent in TX"""
+        if self.regs[RFM69.R_DIOMAPPING1] & 0xC0:
+            v = 0  # other mappings are not modelled
+        elif self._mode == self.RX:
+            v = self._payload_ready
+        elif self._mode == self.TX:
+            v = self._packet_sent
+        else:
+            v = 0
+        self.intpin(v)
+
+#END: sim_rfm69.py
@@ -0,0 +1,241 @@
+# spi_record.py  18/10/2026 - binary SPI traffic recorder and replay links
+#
+# Record a session:  link = SpiRecorder(energenie.get_radio_link(), open("spi.bin", "wb"))
+#                    radio = energenie.EnergenieRadio(link)
+# or into a RAM ring of the latest traffic, then save recorder.dump() later.
+# Replay it:         radio = energenie.EnergenieRadio(ReplayLink(data))
+# Print it:          python3 spi_record.py spi.bin
+
+import plat
+from energenie import RFM69, hexstr
+
+MAGIC      = b"SPI1"
+F_ACCURATE = 0x01  # the recorded link answered real register values
+
+# record: kind(1) t_us(4, little endian ticks_us) n(1) data(n)
+K_SELECT   = 1  # no data
+K_DESELECT = 2  # no data
+K_WRITE    = 3  # tx bytes, nothing read back
+K_XFER     = 4  # n/2 tx bytes, then n/2 rx bytes
+K_FILL     = 5  # tx fill byte, then n-1 rx bytes
+K_BYTE     = 6  # tx byte, rx byte
+K_INT      = 7  # is_int() result
+K_AUTOSEL  = 0x80  # a transfer that did its own select and deselect
+HEAD       = 6
+MAX_DATA   = 255  # n is one byte, so an XFER is at most 127 bytes each way
+
+class SpiRecorder:
+    """A link wrapper that records every SPI transaction, to a file or a RAM ring"""
+    # Anything that is not SPI traffic is passed straight through to the link.
+    def __init__(self, link, out=None, ring_size:int=4096):
+        self._link = link
+        self._out  = out
+        accurate = not plat.MOCKING or getattr(link, "ACCURATE", False)
+        self.header = MAGIC + bytes((F_ACCURATE if accurate else 0,))
+        self._rec  = bytearray(HEAD + MAX_DATA)  # record being built
+        self.records = 0  # number recorded
+        self.dropped = 0  # number pushed out of the ring
+        if out is not None:
+            out.write(self.header)
+            self._ring = None
+        else:
+            self._ring = bytearray(ring_size)
+            self._head = 0  # next byte to write
+            self._used = 0
+
+    def __getattr__(self, name):
+        return getattr(self._link, name)
+
+    #----- LINK ----------------------------------------------------------------
+    def select(self) -> None:
+        self._link.select()
+        self._emit(K_SELECT, 0)
+
+    def deselect(self) -> None:
+        self._link.deselect()
+        self._emit(K_DESELECT, 0)
+
+    def byte(self, tx_byte:int) -> int:
+        rx_byte = self._link.byte(tx_byte)
+        self._rec[HEAD] = tx_byte
+        self._rec[HEAD+1] = rx_byte
+        self._emit(K_BYTE, 2)
+        return rx_byte
+
+    def transfer(self, tx=None, rx=None, select:bool=True):
+        rec = self._rec
+        flag = K_AUTOSEL if select else 0
+        if isinstance(tx, int) or tx is None:
+            n = len(rx)
+            self._fits(n+1)
+            result = self._link.transfer(tx, rx, select)
+            rec[HEAD] = 0 if tx is None else tx
+            rec[HEAD+1:HEAD+1+n] = rx
+            self._emit(K_FILL | flag, n+1)
+        else:
+            n = len(tx)
+            self._fits(n if rx is None else 2*n)
+            rec[HEAD:HEAD+n] = tx  # before rx, which can be the same buffer
+            result = self._link.transfer(tx, rx, select)
+            if rx is None:
+                self._emit(K_WRITE | flag, n)
+            else:
+                rec[HEAD+n:HEAD+2*n] = rx
+                self._emit(K_XFER | flag, 2*n)
+        return result
+
+    def is_int(self) -> bool:
+        v = self._link.is_int()
+        self._rec[HEAD] = 1 if v else 0
+        self._emit(K_INT, 1)
+        return v
+
+    #----- LOG -----------------------------------------------------------------
+    @staticmethod
+    def _fits(n:int) -> None:
+        """Check a transfer fits in one record, before it goes to the link"""
+        if n > MAX_DATA:
+            raise ValueError("SPI transfer too long to record, %d data bytes, max %d" % (n, MAX_DATA))
+
+    def _emit(self, kind:int, n:int) -> None:
+        rec = self._rec
+        t = plat.ticks_us()
+        rec[0] = kind
+        rec[1] = t & 0xFF
+        rec[2] = (t >> 8) & 0xFF
+        rec[3] = (t >> 16) & 0xFF
+        rec[4] = (t >> 24) & 0xFF
+        rec[5] = n
+        self.records += 1
+        mv = memoryview(rec)[0:HEAD+n]
+        if self._ring is None:
+            self._out.write(mv)
+        else:
+            self._append(mv)
+
+    def _append(self, mv) -> None:
+        ring, size, length = self._ring, len(self._ring), len(mv)
+        if length > size:
+            self.dropped += 1
+            return
+        while size - self._used < length:  # push out the oldest whole records
+            tail = (self._head - self._used) % size
+            self._used -= HEAD + ring[(tail + 5) % size]
+            self.dropped += 1
+        first = min(length, size - self._head)
+        ring[self._head:self._head+first] = mv[0:first]
+        if first < length:
+            ring[0:length-first] = mv[first:length]
+        self._head = (self._head + length) % size
+        self._used += length
+
+    def dump(self) -> bytes:
+        """The header and the records held in the ring, oldest first"""
+        if self._ring is None:
+            raise ValueError("dump() is only for a RAM ring recording, this one writes to a file")
+        tail = (self._head - self._used) % len(self._ring)
+        if tail + self._used <= len(self._ring):
+            return self.header + bytes(self._ring[tail:tail+self._used])
+        return self.header + bytes(self._ring[tail:]) + bytes(self._ring[0:self._head])
+
+def records(data):
+    """Yield (kind, t_us, tx, rx) for each record in a log, kind includes K_AUTOSEL"""
+    if bytes(data[0:4]) != MAGIC:
+        raise ValueError("Not an SPI recording")
+    i = len(MAGIC) + 1
+    while i + HEAD <= len(data):
+        kind = data[i]
+        t = data[i+1] | (data[i+2] << 8) | (data[i+3] << 16) | (data[i+4] << 24)
+        n = data[i+5]
+        d = data[i+HEAD:i+HEAD+n]
+        i += HEAD + n
+        k = kind & ~K_AUTOSEL
+        if k == K_WRITE:  yield kind, t, d, None
+        elif k == K_XFER: yield kind, t, d[0:n//2], d[n//2:]
+        elif k == K_FILL: yield kind, t, d[0], d[1:]
+        elif k == K_BYTE: yield kind, t, d[0], d[1]
+        elif k == K_INT:  yield kind, t, None, d[0]
+        else:             yield kind, t, None, None
+
+class ReplayLink:
+    """A link that plays back the responses from a recording"""
+    # With strict, each call must match what was recorded (the same kind of
+    # transaction, and the same bytes sent) or ReplayLink.Mismatch is raised.
+    class Mismatch(Exception): pass
+
+    def __init__(self, data, strict:bool=True):
+        self.ACCURATE = (data[4] & F_ACCURATE) != 0  # so RFM69 waits as it did
+        self._strict = strict
+        self._it = records(data)
+        self.replayed = 0
+
+    def _next(self, kind:int, tx=None):
+        r = next(self._it, None)
+        if r is None:
+            raise self.Mismatch("end of recording after %d records" % self.replayed)
+        if self._strict:
+            if r[0] != kind:
+                raise self.Mismatch("record %d: kind %02X, recorded %02X" % (self.replayed, kind, r[0]))
+            if tx is not None and bytes(tx) != bytes(r[2]):
+                raise self.Mismatch("record %d: sent %s, recorded %s"
+                                    % (self.replayed, hexstr(tx), hexstr(r[2])))
+        self.replayed += 1
+        return r
+
+    def select(self) -> None:   self._next(K_SELECT)
+    def deselect(self) -> None: self._next(K_DESELECT)
+
+    def byte(self, tx_byte:int) -> int:
+        r = self._next(K_BYTE)
+        if self._strict and tx_byte != r[2]:
+            raise self.Mismatch("record %d: sent %02X, recorded %02X" % (self.replayed - 1, tx_byte, r[2]))
+        return r[3]
+
+    def transfer(self, tx=None, rx=None, select:bool=True) -> None:
+        flag = K_AUTOSEL if select else 0
+        if isinstance(tx, int) or tx is None:
+            r = self._next(K_FILL | flag)
+        elif rx is None:
+            r = self._next(K_WRITE | flag, tx)
+        else:
+            r = self._next(K_XFER | flag, tx)
+        if rx is not None:
+            rx[0:len(rx)] = r[3]
+
+    def is_int(self) -> bool:
+        return self._next(K_INT)[3] != 0
+
+    def reset(self): pass
+    def power(self, flag=True): pass
+    def irq(self, handler): pass
+    def has_fifo_irq(self): return False
+    def txing(self, flag): pass
+    def rxing(self, flag): pass
+
+def show(data) -> None:
+    """Print a recording as a readable trace"""
+    NAMES = {K_SELECT:"sel", K_DESELECT:"desel", K_WRITE:"write", K_XFER:"xfer",
+             K_FILL:"fill", K_BYTE:"byte", K_INT:"int"}
+    start = None
+    for kind, t, tx, rx in records(data):
+        if start is None: start = t
+        dt = (t - start) & ((1 << 30) - 1)  # ticks wrap
+        k = kind & ~K_AUTOSEL
+        what = NAMES.get(k, "???")
+        if kind & K_AUTOSEL and (k == K_WRITE or k == K_XFER):
+            name = RFM69.regname(tx[0] & 0x7F) or "???"
+            what = "%s %s %s" % ("WR" if tx[0] & 0x80 else "RD", name, what)
+        if k == K_XFER or k == K_WRITE:
+            what += " tx:%s" % hexstr(tx)
+        elif k == K_FILL or k == K_BYTE:
+            what += " tx:%02X" % tx
+        if rx is not None:
+            what += " rx:%s" % (hexstr(rx) if k == K_XFER or k == K_FILL else "%02X" % rx)
+        print("%10dus %s" % (dt, what))
+
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1], "rb") as f:
+        show(f.read())
+
+#END: spi_record.py
@@ -3,6 +3,76 @@
 import plat
 import energenie
 import json
+from fake_link import FakeLink
+from sim_rfm69 import SimulatedRFM69
+import spi_record
+
+# real captured messages
+MSG1 = b"\x0D\x04\x02\x4B\xA8\x98\x36\xEF\x9C\xC0\x3D\xE2\x25\x72"
+MSG2 = b"\x0D\x04\x02\xB9\x28\x0C\x8D\x78\x8F\x65\xBA\xED\x7B\x84"
+MSG3 = b"\x16\x04\x05\xC9\x8C\xFB\xD7\x5A\x44\x8E\xEE\x83\x21\xCC\xCB\xCF\x4A\xB8\x64\x66\x2C\x64\xAF"
+MSG4 = b"\x1C\x04\x02\x58\x0B\x55\x24\x23\xBC\xD2\xAC\x50\x8D\x26\x5B\xA2\xCF\x74\xB7\x73\x47\x4A\xA9\xF1\x97\xF1\xF0\x3F\x23"
+MSGS = (MSG1, MSG2, MSG3, MSG4)
+
+def test_crc():
+    """Test that the table CRC engine matches the bitwise reference"""
+    FRAMES = (b"", b"\x00", b"\xFF", b"123456789", bytes(range(256)),
+              b"\x00\x03\x73\xF3\x01\x01\x00")
+    for frame in FRAMES:
+        assert energenie.CRC.calc(frame) == energenie.CRC.calc_bits(frame)
+
+    # incremental update in chunks gives the same result as one shot
+    data = bytes(range(256))
+    crc = 0
+    for i in range(0, len(data), 7):
+        crc = energenie.CRC.update(crc, data[i:i+7])
+    assert crc == energenie.CRC.calc(data)
+
+    for crc in energenie.CRC.calc_many(FRAMES):
+        print("crc:%04X" % crc)
+
+def test_crypt():
+    """Test that the cached keystream crypts the same as the LFSR"""
+    Crypt = energenie.Crypt
+    DATA = bytes(range(80))  # longer than the cached keystream
+
+    Crypt.cache_clear()
+    Crypt.cache_limit(0)  # disabled, pure LFSR
+    expected = [bytes(Crypt(242, pip).block(bytearray(DATA))) for pip in (0x0100, 0x4BA8, 0xB928)]
+
+    Crypt.cache_limit(2 * Crypt.STREAM_LEN)  # room for only two streams
+    for _ in range(2):
+        for i, pip in enumerate((0x0100, 0x4BA8, 0xB928)):
+            assert bytes(Crypt(242, pip).block(bytearray(DATA))) == expected[i]
+            c = Crypt(242, pip)
+            assert bytes(c.block(bytearray(DATA[:10])) + c.block(bytearray(DATA[10:]))) == expected[i]
+            c = Crypt(242, pip)
+            assert bytes([c.byte(b) for b in DATA]) == expected[i]
+    print("crypt hits:%d misses:%d" % (Crypt.hits, Crypt.misses))
+    Crypt.cache_clear()
+    Crypt.cache_limit(4 * Crypt.STREAM_LEN)
+
+def test_crypt_crc():
+    """Test the fused crypt+crc kernels against separate crypt and crc"""
+    Crypt, CRC = energenie.Crypt, energenie.CRC
+    for limit in (0, 4 * Crypt.STREAM_LEN):  # LFSR path, then cached path
+        Crypt.cache_limit(limit)
+        for n in (2, 9, 70):
+            plain = bytearray(range(n))
+            CRC.sign(plain)
+            expected = Crypt(242, 0x1234).block(bytearray(plain))
+
+            body = bytearray(range(n))
+            Crypt(242, 0x1234).sign_encrypt(body)
+            assert body == expected
+
+            assert Crypt(242, 0x1234).decrypt_verify(body)
+            assert body == plain
+
+            body = bytearray(expected)
+            body[0] ^= 0x01  # corrupt
+            assert not Crypt(242, 0x1234).decrypt_verify(body)
+    print("crypt crc ok")
 
 def test_encode():
     """Test that we can encode switch messages"""
@@ -14,13 +84,22 @@ def test_encode():
     print(energenie.hexstr(ON))
     print(energenie.hexstr(OFF))
 
+def test_encode_legacy():
+    """Test that the nibble table legacy encoder matches the bit encoder"""
+    L = energenie.LegacySocket
+    ADDRS = (0x00000, 0xFFFFF, 0xA0170, 0x6C6C6, 0x12345)
+    for address in ADDRS:
+        for k in range(16):
+            slow = bytearray(16)
+            slow[0:4] = L.PREAMBLE
+            L.encode_bits_slow(slow, address, 4, 20)
+            L.encode_bits_slow(slow, k, 14, 4)
+            assert L.encode_msg(address, k) == slow
+    for frame in L.encode_table(ADDRS, L.switch_to_k(L.ALL, True)):
+        print(energenie.hexstr(frame))
+
 def test_decode():
     """Test that we can decode to dict/json real captured messages"""
-    MSG1 = b"\x0D\x04\x02\x4B\xA8\x98\x36\xEF\x9C\xC0\x3D\xE2\x25\x72"
-    MSG2 = b"\x0D\x04\x02\xB9\x28\x0C\x8D\x78\x8F\x65\xBA\xED\x7B\x84"
-    MSG3 = b"\x16\x04\x05\xC9\x8C\xFB\xD7\x5A\x44\x8E\xEE\x83\x21\xCC\xCB\xCF\x4A\xB8\x64\x66\x2C\x64\xAF"
-    MSG4 = b"\x1C\x04\x02\x58\x0B\x55\x24\x23\xBC\xD2\xAC\x50\x8D\x26\x5B\xA2\xCF\x74\xB7\x73\x47\x4A\xA9\xF1\x97\xF1\xF0\x3F\x23"
-    MSGS = (MSG1, MSG2, MSG3, MSG4)
 
     for msg in MSGS:
         buffer = bytearray(msg)
@@ -32,6 +111,436 @@ def test_decode():
         ot_msg = energenie.OpenThingsLite.decode(raw_msg)
         print(json.dumps(ot_msg, indent=2))
 
+def test_decode_pool():
+    """Test that the pooled decoder matches the dict decoder"""
+    decoder = energenie.OTDecoder()
+    for msg in MSGS:
+        expected = energenie.OpenThingsLite.decode(bytearray(msg))
+        ot_msg = decoder.decode(bytearray(msg))
+        assert ot_msg.to_dict() == expected
+        rec = ot_msg.find(energenie.Parameter.P_SWITCH_STATE) or ot_msg.recs[0]
+        print("sensorid:%06X nrecs:%d %s=%s" % (ot_msg.sensorid, ot_msg.nrecs, rec.paramname(), rec.value()))
+
+def test_view():
+    """Test that the lazy view matches the dict decoder"""
+    for msg in MSGS:
+        expected = energenie.OpenThingsLite.decode(bytearray(msg))
+        view = energenie.OpenThingsView.open(bytearray(msg))
+        assert view.to_dict() == expected
+        rec = view.find(energenie.Parameter.P_REAL_POWER)
+        print("sensorid:%06X REAL_POWER=%s" % (view.sensorid(), None if rec is None else rec.value()))
+
+def test_receive_stream():
+    """Test that received frames stream through the ring, and overflows count"""
+    link = FakeLink(MSGS)
+    radio = energenie.EnergenieRadio(link, rx_ring=2)
+    radio.always_receive()
+
+    # consumer falls behind, only two frames fit in the ring
+    for _ in range(len(MSGS)):
+        radio.rx_poll()
+    print("ring overflows:%d" % radio.overflows())
+
+    for frame, timestamp in radio.raw_frames(wait_ms=0):
+        print("raw frame:%s" % energenie.hexstr(frame))
+
+    link.frames = list(MSGS)
+    for view, timestamp in radio.messages(wait_ms=0):
+        print("message from sensorid:%06X" % view.sensorid())
+
+def test_receive_interrupt():
+    """Test that DIO0 interrupts drain frames into the ring without polling"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.always_receive()
+    radio.rx_interrupts()
+    for msg in MSGS[:3]:
+        link.inject(msg)  # each arrival raises DIO0
+
+    for view, timestamp in radio.messages(wait_ms=0):
+        print("irq message from sensorid:%06X" % view.sensorid())
+    radio.rx_interrupts(False)
+
+    # DIO0 already high when interrupts start, then an edge while busy
+    link.inject(MSG4)
+    radio.rx_interrupts()
+    radio.busy += 1  # the foreground is using the radio
+    link.inject(MSG1)
+    print("irq drained while busy:%d" % len(radio._ring))
+    radio.busy -= 1
+    for view, timestamp in radio.messages(wait_ms=100):
+        print("irq late message from sensorid:%06X" % view.sensorid())
+    radio.rx_interrupts(False)
+
+def test_reconfigure():
+    """Test that switching OOK<->FSK only writes the registers that differ"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    for cfg in (radio.OOK, radio.FSK, radio.OOK, radio.FSK, radio.FSK):
+        link.writes = 0
+        radio.want_cfg(cfg)
+        print("cfg:%d register writes:%d" % (cfg, link.writes))
+
+def test_waitreg():
+    """Test that waitreg gives up at its deadline, and keeps stats per site"""
+    R = energenie.RFM69
+    rfm = R(FakeLink())
+    rfm.waitreg(R.R_IRQFLAGS2, R.M_FIFONOTEMPTY, 0, "empty")  # fake reads 0
+    try:
+        rfm.waitreg(R.R_IRQFLAGS1, R.M_MODEREADY, R.M_MODEREADY, "ready", timeout_us=2000)
+        print("no timeout")
+    except R.WaitTimeout as e:
+        print("timeout:%s" % str(e).split(" after")[0])
+    for site in sorted(rfm.waitstats):
+        stat = rfm.waitstats[site]
+        print("waitstat %s calls:%d timeouts:%d" % (site, stat[0], stat[4]))
+
+def test_tx_queue():
+    """Test that a mixed scene is sent grouped by config"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.on()
+    handles = []
+    for i in range(10):
+        legacy = energenie.LegacySocket.encode_msg(0x6C6C0 + i, energenie.LegacySocket.switch_to_k(1, False))
+        handles.append(radio.queue(radio.OOK, legacy, times=8, gap_ms=1))
+        mihome = energenie.OpenThingsLite.make_switch_message(0x02000370 + i, False)
+        handles.append(radio.queue(radio.FSK, mihome, times=4))
+    switches = radio.cfg_switches
+    sent = radio.flush()
+    print("sent:%d done:%d reconfigurations:%d" % (sent, sum(h.done() for h in handles),
+                                                   radio.cfg_switches - switches))
+
+    sim = SimulatedRFM69()
+    radio = energenie.EnergenieRadio(sim)
+    radio.on()
+    handle = radio.queue(radio.FSK, mihome)
+    sim.regs[energenie.RFM69.R_VERSION] = 0  # so the FSK reconfigure fails
+    try:
+        radio.flush()
+    except energenie.EnergenieRadio.RadioError as e:
+        print("flush reconfigure failed, handle failed:%s error:%s"
+              % (handle.status == energenie.TxHandle.FAILED, e))
+
+def test_duty_cycle():
+    """Test airtime estimates, and that the duty cycle budget is enforced"""
+    radio = energenie.EnergenieRadio(FakeLink())
+    LEGACY = energenie.LegacySocket.encode_msg()
+    print("airtime legacy x8:%dus mihome x4:%dus" % (radio.airtime_us(16, 8, radio.OOK),
+                                                  radio.airtime_us(14, 4, radio.FSK)))
+
+    # 10% of a 10s window is 1s of airtime, enough for 4 full legacy sets
+    Duty = energenie.DutyCycle
+    radio.duty = Duty(limit_pct=10, window_ms=10000, buckets=10, policy=Duty.SHORTEN)
+    radio.on()
+    for i in range(6):
+        try:
+            radio.send(LEGACY, times=8, tag="scene%d" % (i % 2))
+        except Duty.Exceeded as e:
+            print("rejected:%s" % e)
+    radio.duty.policy = Duty.REJECT
+    try:
+        radio.send(LEGACY, times=1)
+    except Duty.Exceeded:
+        print("rejected when out of budget")
+    metrics = radio.duty.metrics()
+    print("sent:%d shortened:%d rejected:%d used_us:%d" % (metrics["sent"], metrics["shortened"],
+                                                           metrics["rejected"], metrics["used_us"]))
+    for tag in sorted(radio.duty.by_tag):
+        print("%s used:%dus" % (tag, radio.duty.by_tag[tag]))
+
+def test_stream():
+    """Test that long data streams through the FIFO in threshold sized refills"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.want_cfg(radio.OOK)
+    train = energenie.RFM69.repeat(energenie.LegacySocket.encode_msg(), 20)  # 320 bytes
+    link.writes = 0
+    nbytes = radio.send_stream(train, tag="train")
+    print("streamed:%d register writes:%d used_us:%d" % (nbytes, link.writes,
+                                                         radio.duty.by_tag["train"]))
+
+    radio.duty = energenie.DutyCycle(limit_pct=1, window_ms=1000, buckets=10)  # 10ms budget
+    link.writes = 0
+    try:
+        radio.send_stream(energenie.RFM69.repeat(energenie.LegacySocket.encode_msg(), 20), nbytes=320)
+        print("stream over budget sent")
+    except energenie.DutyCycle.Exceeded:
+        print("stream over budget rejected, writes:%d" % link.writes)
+
+    big = bytes(range(100))  # too long for transmit_burst
+    link.writes = 0
+    radio.rfm().transmit(big, 2)
+    print("long payload register writes:%d" % link.writes)
+
+def test_auto_rx():
+    """Test that AutoModes sends from RX without any OPMODE round trips"""
+    for auto in (False, True):
+        link = FakeLink()
+        radio = energenie.EnergenieRadio(link)
+        radio.always_receive()
+        radio.auto_rx(auto)
+        payload = energenie.OpenThingsLite.make_switch_message(0x02000373, True)
+        link.writes = 0
+        for i in range(3):
+            radio.send(payload, times=4)
+        print("auto_rx:%s register writes:%d mode:%02X" % (auto, link.writes, radio.rfm().getmode()))
+
+def test_simulated():
+    """Test send and receive against the register level emulator, with no waits skipped"""
+    sim = SimulatedRFM69()
+    radio = energenie.EnergenieRadio(sim)
+    radio.on()
+    legacy = energenie.LegacySocket.encode_msg()
+    radio.send(legacy, times=8)
+    print("sim legacy on air ok:%s" % (b"".join(sim.sent) == legacy * 8))
+
+    radio.want_cfg(radio.FSK)
+    mihome = energenie.OpenThingsLite.make_switch_message(0x02000373, True)
+    sim.sent = []
+    radio.send(mihome, times=4)
+    print("sim mihome packets:%d ok:%s" % (len(sim.sent), all(p == mihome for p in sim.sent)))
+
+    radio.always_receive()
+    sim.inject(MSG1)
+    sim.inject(MSG3, delay_us=100000)
+    for view, timestamp in radio.messages(wait_ms=300):
+        print("sim message from sensorid:%06X" % view.sensorid())
+
+    radio.rx_interrupts()  # only DIO0 is watched until a frame lands
+    sim.inject(MSG2)
+    sim.inject(MSG4, delay_us=100000)
+    for view, timestamp in radio.messages(wait_ms=300):
+        print("sim irq message from sensorid:%06X" % view.sensorid())
+    radio.rx_interrupts(False)
+
+    sim.inject(MSG2)  # still on air when we turn around to send
+    radio.send(mihome)
+    plat.sleep_ms(100)
+    sim.tick()  # it has landed by now
+    print("sim lost during send:%d" % sim.rx_lost)
+
+    radio.auto_rx(True)
+    big = bytes((39,)) + bytes(range(39))  # more than FIFO_HALF, so streamed
+    sim.sent = []
+    radio.send(big, times=2)
+    radio.queue(radio.FSK, big)
+    radio.flush()
+    print("sim auto_rx streamed packets:%d ok:%s mode:%02X autotx:%s"
+          % (len(sim.sent), all(p == big for p in sim.sent), radio.rfm().getmode(), radio.rfm().autotx))
+
+    radio.send(mihome)  # FIFOTHRESH is left at 13
+    sim.sent = []
+    sim.inject(MSG3, delay_us=10000)  # 23 bytes, raises FifoLevel as it arrives
+    for view, timestamp in radio.messages(wait_ms=300):
+        print("sim auto_rx message from sensorid:%06X" % view.sensorid())
+    R = energenie.RFM69
+    in_auto = (radio.rfm().readreg(R.R_IRQFLAGS1) & R.M_AUTOMODE) != 0
+    print("sim auto_rx after receiving sent:%d in AutoModes TX:%s" % (len(sim.sent), in_auto))
+    radio.auto_rx(False)
+
+def test_dio_waits():
+    """Test that in RX_INT the PacketSent and PayloadReady waits idle for the DIO0 edge"""
+    sim = SimulatedRFM69()
+    radio = energenie.EnergenieRadio(sim)
+    radio.always_receive()
+    radio.rfm().set_rxmode(energenie.RFM69.RX_INT)
+    mihome = energenie.OpenThingsLite.make_switch_message(0x02000373, True)
+    radio.send(mihome)  # a lone packet ends on PacketSent
+    sim.inject(MSG3, delay_us=50000)
+    buffer = bytearray(radio.MTU)
+    nb = radio.recvinto(buffer, wait_ms=300)
+    stats = radio.rfm().waitstats
+    print("dio waits packets:%d received:%d edges:%d packetsent:%d payloadready:%d timeouts:%d"
+          % (len(sim.sent), nb, radio.rfm().dio_edges, stats["packetsent"][0], stats["payloadready"][0],
+             stats["packetsent"][4] + stats["payloadready"][4]))
+    print("dio nothing received:%d timeouts:%d" % (radio.recvinto(buffer, wait_ms=20),
+                                                   stats["payloadready"][4]))
+    radio.rfm().set_rxmode(energenie.RFM69.RX_POLL)
+
+def test_instruments():
+    """Test that probes count calls and bytes, round trip as bytes, and come out cleanly"""
+    link = FakeLink([MSG1])
+    radio = energenie.EnergenieRadio(link)
+    probes = energenie.Instruments(radio)
+    probes.enable()
+    radio.want_cfg(radio.FSK)
+    radio.send(energenie.OpenThingsLite.make_switch_message(0x02000373, True), times=2)
+    buffer = bytearray(radio.MTU)
+    nb = radio.recvinto(buffer)
+    energenie.OpenThingsLite.decode(memoryview(buffer)[0:nb])
+    snapshot = probes.snapshot()
+    for name in sorted(snapshot):
+        print("probe %s calls:%d bytes:%d" % (name, snapshot[name]["calls"], snapshot[name]["bytes"]))
+    assert energenie.Instruments.parse(probes.snapshot_bytes()) == snapshot
+    probes.stats["radio.recvinto"].nbytes += 5 << 30  # a long running capture
+    parsed = energenie.Instruments.parse(probes.snapshot_bytes())
+    print("probe bytes past 4GiB:%d" % parsed["radio.recvinto"]["bytes"])
+    probes.disable()
+    assert "readreg" not in radio.rfm().__dict__ and "transfer" not in link.__dict__
+    radio.want_cfg(radio.OOK)
+    print("probes disabled, want_cfg calls:%d" % probes.snapshot()["radio.want_cfg"]["calls"])
+
+def test_spi_record():
+    """Test that a recorded session replays exactly, and the ring keeps the latest"""
+    def session(link) -> bytes:
+        radio = energenie.EnergenieRadio(link)
+        radio.want_cfg(radio.FSK)
+        radio.send(energenie.OpenThingsLite.make_switch_message(0x02000373, True), times=2)
+        buffer = bytearray(radio.MTU)
+        nb = radio.recvinto(buffer)
+        return bytes(buffer[0:nb])
+
+    recorder = spi_record.SpiRecorder(FakeLink([MSG1]))
+    received = session(recorder)
+    log = recorder.dump()
+    replay = spi_record.ReplayLink(log)
+    same = session(replay) == received
+    print("recorded:%d bytes:%d replayed:%d same:%s" % (recorder.records, len(log),
+                                                        replay.replayed, same))
+
+    recorder = spi_record.SpiRecorder(FakeLink(), ring_size=128)
+    radio = energenie.EnergenieRadio(recorder)
+    for cfg in (radio.OOK, radio.FSK, radio.OOK):
+        radio.want_cfg(cfg)
+    kept = len(list(spi_record.records(recorder.dump())))
+    print("ring recorded:%d dropped:%d kept:%d" % (recorder.records, recorder.dropped, kept))
+
+    recorder = spi_record.SpiRecorder(FakeLink([MSG1]))
+    recorder.select()
+    recorder.byte(energenie.RFM69.R_FIFO)  # a FIFO read, replayed as a write
+    replay = spi_record.ReplayLink(recorder.dump())
+    replay.select()
+    try:
+        replay.byte(energenie.RFM69.R_FIFO | 0x80)
+        print("replay byte mismatch not seen")
+    except spi_record.ReplayLink.Mismatch as e:
+        print("replay mismatch:%s" % e)
+
+    R = energenie.RFM69
+    def fifo_session(link) -> bytes:
+        full = bytes(range(R.FIFO_SIZE))
+        link.transfer(bytes((R.R_FIFO | 0x80,)) + full)  # fill the FIFO
+        link.select()
+        link.byte(R.R_FIFO)
+        rx = bytearray(R.FIFO_SIZE)
+        link.transfer(R.R_FIFO, rx, select=False)  # read it back in one burst
+        link.deselect()
+        return bytes(rx)
+
+    recorder = spi_record.SpiRecorder(SimulatedRFM69())
+    received = fifo_session(recorder)
+    same = fifo_session(spi_record.ReplayLink(recorder.dump())) == received
+    print("full FIFO burst ok:%s replayed same:%s" % (received == bytes(range(R.FIFO_SIZE)), same))
+    try:
+        recorder.transfer(bytes(200), bytearray(200))
+        print("oversized transfer recorded")
+    except ValueError as e:
+        print("oversized transfer:%s records:%d" % (e, recorder.records))
+
+    import io
+    recorder = spi_record.SpiRecorder(FakeLink(), io.BytesIO())
+    try:
+        recorder.dump()
+        print("file recording dumped")
+    except ValueError as e:
+        print("file recording dump:%s" % e)
+
+def test_capture():
+    """Test that received frames are captured, read back, and the ring keeps the latest"""
+    import io, os
+    FILENAME = "test_capture.bin"
+    if FILENAME in os.listdir("."): os.remove(FILENAME)
+    for filename in (FILENAME, None):
+        link = FakeLink(MSGS)
+        radio = energenie.EnergenieRadio(link)
+        radio.always_receive()
+        capture = radio.capture(filename, ring_size=80)
+        for view, timestamp in radio.messages(wait_ms=0): pass
+        radio.capture_stop()
+        if filename is None:
+            data = capture.dump()
+        else:
+            with open(filename, "rb") as f: data = f.read()
+            os.remove(filename)
+        frames = [(rssi, cfg, bytes(frame)) for t, rssi, cfg, frame in energenie.Capture.reader(io.BytesIO(data))]
+        print("capture %s records:%d dropped:%d read:%d" % ("file" if filename else "ring", capture.records,
+                                                            capture.dropped, len(frames)))
+        for rssi, cfg, frame in frames:
+            print("  rssi:%d cfg:%d %s" % (rssi, cfg, energenie.hexstr(frame[0:4])))
+        assert [f[2] for f in frames] == list(MSGS[len(MSGS)-len(frames):])
+
+    # captured before the radio was ever configured
+    radio = energenie.EnergenieRadio(FakeLink([MSG1]))
+    capture = radio.capture(FILENAME)
+    nb = radio.recvinto(bytearray(radio.MTU))
+    radio.capture_stop()
+    try:
+        capture.dump()
+        print("file capture dumped")
+    except ValueError as e:
+        print("file capture dump:%s" % e)
+    with open(FILENAME, "rb") as f: data = f.read()
+    os.remove(FILENAME)
+    cfgs = [cfg for t, rssi, cfg, frame in energenie.Capture.reader(io.BytesIO(data))]
+    print("capture unconfigured nb:%d cfgs:%s" % (nb, cfgs))
+
+def test_decode_capture():
+    """Test that a capture file decodes the same on one core and across a pool"""
+    import io, os
+    import decode_capture
+    FILENAME = "test_decode.bin"
+    capture = energenie.Capture(FILENAME)
+    bad = bytearray(MSG1)
+    bad[-1] ^= 0xFF  # corrupt the CRC
+    odd = bytearray(energenie.OpenThingsLite.make_switch_message(0x02000373, True))
+    energenie.OpenThingsLite.decrypt(odd)
+    odd[9] = 0xC1  # a CRC valid record of an unknown typeid
+    energenie.Crypt(242, odd[3]<<8 | odd[4]).sign_encrypt(memoryview(odd)[5:])
+    for i in range(50):
+        for msg in MSGS + (bad, odd):
+            capture.write(msg, len(msg), 0x60, energenie.EnergenieRadio.FSK)
+    capture.close()
+    outputs = []
+    for jobs, fmt in ((1, "jsonl"), (2, "jsonl"), (1, "csv")):
+        out = io.StringIO()
+        stats = decode_capture.decode_file(FILENAME, out, jobs, chunk_bytes=1024, fmt=fmt)
+        outputs.append(out.getvalue())
+        print("decode jobs:%d %s frames:%d crc_failures:%d chunks:%d" % (jobs, fmt, stats["frames"],
+                                                                        stats["crc_failures"], stats["chunks"]))
+    os.remove(FILENAME)
+    assert outputs[0] == outputs[1]
+    print(outputs[0].splitlines()[0].split('"cfg"')[1])
+    print(outputs[0].splitlines()[4].split('"cfg"')[1])
+    print(outputs[2].splitlines()[1].split(",", 1)[1])
+
+def test_batch():
+    """Test that a batch decrypt matches Crypt and CRC frame by frame"""
+    import ot_batch
+    bad = bytearray(MSG3)
+    bad[-1] ^= 0xFF  # corrupt the CRC
+    frames = MSGS + (bad, MSG1[0:8])
+    padded = [bytes(f).ljust(energenie.EnergenieRadio.MTU, b"\0") for f in frames]
+    valid, sensorid, productid, plain = ot_batch.decrypt_verify(padded, [len(f) for f in frames])
+    for i, frame in enumerate(frames):
+        buf = bytearray(frame)
+        body = memoryview(buf)[energenie.OpenThingsLite.HEADER_LEN:]
+        ok = len(buf) >= ot_batch.MIN_LEN and energenie.Crypt(242, buf[3]<<8 | buf[4]).decrypt_verify(body)
+        assert bool(valid[i]) == ok
+        if ok: assert bytes(plain[i][0:len(buf)]) == bytes(buf)
+    if ot_batch.np is not None:  # the numpy path must agree with the pure Python one
+        lengths = [len(f) for f in frames]
+        expected = ot_batch.decrypt_verify_python(padded, lengths)
+        for rows in (padded, ot_batch.np.frombuffer(b"".join(padded), ot_batch.np.uint8).reshape(-1, ot_batch.MTU)):
+            got = ot_batch.decrypt_verify_numpy(rows, lengths)
+            assert [bool(v) for v in got[0]] == expected[0]
+            assert [int(v) for v in got[1]] == expected[1]
+            assert [int(v) for v in got[2]] == expected[2]
+            assert [bytes(row) for row in got[3]] == [bytes(row) for row in expected[3]]
+    print("batch valid:%s" % [bool(v) for v in valid])
+    print("batch sensorid:%s productid:%s" % (["%06X" % s if s >= 0 else None for s in sensorid],
+                                              [int(p) for p in productid]))
+
 def test_send():
     """Test that when we send, the radio is correctly exercised"""
     # because we are on host, MOCKING will be true, and trace goes to stdout
@@ -47,12 +556,39 @@ def test_send():
     print("\nLegacy OFF")
     legacy.set(False, times=1)
 
+    print("\nLegacy burst ON")
+    row = [energenie.LegacySocket(0x6C6C6, channel) for channel in (1, 2, 3)]
+    used = energenie.radio.duty.by_tag.get(0x6C6C6, 0)
+    energenie.Socket.set_many(row, True, times=1)
+    print("burst airtime for the row:%dus" % (energenie.radio.duty.by_tag.get(0x6C6C6, 0) - used))
+
     print("\nMiHome ON")
     mihome.on()
 
     print("\nMiHome OFF")
     mihome.off()
 
+test_crc()
+test_crypt()
+test_crypt_crc()
 test_encode()
+test_encode_legacy()
 test_decode()
+test_decode_pool()
+test_view()
+test_receive_stream()
+test_receive_interrupt()
+test_reconfigure()
+test_waitreg()
+test_tx_queue()
+test_duty_cycle()
+test_stream()
+test_auto_rx()
+test_simulated()
+test_dio_waits()
+test_instruments()
+test_spi_record()
+test_capture()
+test_decode_capture()
+test_batch()
 test_send()
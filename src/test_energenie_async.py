@@ -0,0 +1,136 @@
+# test_energenie_async.py  18/10/2026
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import energenie
+import energenie_async
+from fake_link import FakeLink
+from sim_rfm69 import SimulatedRFM69
+
+MSG1 = b"\x0D\x04\x02\x4B\xA8\x98\x36\xEF\x9C\xC0\x3D\xE2\x25\x72"
+MSG3 = b"\x16\x04\x05\xC9\x8C\xFB\xD7\x5A\x44\x8E\xEE\x83\x21\xCC\xCB\xCF\x4A\xB8\x64\x66\x2C\x64\xAF"
+
+def test_concurrent():
+    """Test that send, receive and a busy task all make progress together"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.on()
+    aradio = energenie_async.AsyncEnergenieRadio(radio)
+    legacy = energenie_async.AsyncSocket(energenie.LegacySocket(), aradio)
+    mihome = energenie_async.AsyncSocket(energenie.MiHomeSocket(0x02000373), aradio)
+    log = {"sent": [], "received": [], "ticks": 0}
+    done = []
+
+    async def sender():
+        for state in (True, False):
+            await legacy.set(state)
+            log["sent"].append("legacy %s" % state)
+            await mihome.set(state)
+            log["sent"].append("mihome %s" % state)
+        done.append(True)
+
+    async def air():
+        for msg in (MSG1, MSG3):
+            await energenie_async.sleep_ms(20)
+            link.inject(msg)
+
+    async def receiver():
+        async for view in aradio.messages(wait_ms=200):
+            log["received"].append("%06X" % view.sensorid())
+
+    async def ticker():
+        while not done:
+            log["ticks"] += 1
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(sender(), air(), receiver(), ticker())
+
+    asyncio.run(main())
+    for line in log["sent"]: print("sent:%s" % line)
+    for line in log["received"]: print("received:%s" % line)
+    print("ticker made progress:%s" % (log["ticks"] > 10))
+
+def test_stream():
+    """Test that payloads longer than half the FIFO stream, with and without auto_rx"""
+    sim = SimulatedRFM69()
+    radio = energenie.EnergenieRadio(sim)
+    radio.always_receive()
+    aradio = energenie_async.AsyncEnergenieRadio(radio)
+    big = bytes((39,)) + bytes(range(39))  # more than FIFO_HALF
+
+    async def main():
+        for auto in (False, True):
+            radio.auto_rx(auto)
+            sim.sent = []
+            await aradio.send(big, times=2)
+            print("stream auto_rx:%s packets:%d ok:%s mode:%02X autotx:%s"
+                  % (auto, len(sim.sent), all(p == big for p in sim.sent),
+                     radio.rfm().getmode(), radio.rfm().autotx))
+        radio.rfm().waitstats.clear()
+        radio.want_cfg(radio.OOK)
+        await aradio.send(energenie.LegacySocket.encode_msg(), times=8)
+        stats = radio.rfm().waitstats.values()
+        polls, total_us = sum(s[1] for s in stats), sum(s[2] for s in stats)
+        print("legacy waits back off:%s" % (total_us // polls >= 200))
+
+    asyncio.run(main())
+
+def test_defer():
+    """Test that a deferred send waits for budget without blocking other tasks"""
+    radio = energenie.EnergenieRadio(FakeLink())
+    radio.on()
+    Duty = energenie.DutyCycle
+    # 100ms of airtime per 200ms, and the legacy set below takes about 80ms
+    radio.duty = Duty(limit_pct=50, window_ms=200, buckets=4, policy=Duty.DEFER, max_defer_ms=1000)
+    aradio = energenie_async.AsyncEnergenieRadio(radio)
+    legacy = energenie.LegacySocket.encode_msg()
+    ticks = [0]
+    done = []
+
+    async def sender():
+        for i in range(2):
+            await aradio.send(legacy, times=3)
+        done.append(True)
+
+    async def ticker():
+        while not done:
+            ticks[0] += 1
+            await energenie_async.sleep_ms(1)
+
+    async def main():
+        await asyncio.gather(sender(), ticker())
+
+    asyncio.run(main())
+    metrics = radio.duty.metrics()
+    print("defer sent:%d deferred:%d rejected:%d ticker made progress:%s"
+          % (metrics["sent"], metrics["deferred"], metrics["rejected"], ticks[0] > 10))
+
+def test_ring():
+    """Test that frames moved into the receive ring around a send are received and captured"""
+    link = FakeLink()
+    radio = energenie.EnergenieRadio(link)
+    radio.always_receive()
+    radio.auto_rx(True)
+    capture = radio.capture()
+    aradio = energenie_async.AsyncEnergenieRadio(radio)
+    mihome = energenie.OpenThingsLite.make_switch_message(0x02000373, True)
+
+    async def main():
+        link.inject(MSG1)
+        await aradio.send(mihome)  # the FIFO is shared, so MSG1 is moved out of the way
+        link.inject(MSG3)
+        async for view in aradio.messages(wait_ms=50):
+            print("ring received:%06X" % view.sensorid())
+
+    asyncio.run(main())
+    radio.capture_stop()
+    print("ring captured:%d left in ring:%d" % (capture.records, len(radio.rx_ring())))
+
+test_concurrent()
+test_stream()
+test_defer()
+test_ring()